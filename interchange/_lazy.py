@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def lazy_attributes(namespace, builders):
+    """ Return a module-level `__getattr__` function that builds each
+    attribute named in `builders` on first access, by calling the
+    function it maps to, and then stores the result in `namespace`
+    so that later lookups find it directly.
+
+    :param namespace: globals of the module that owns the attributes
+    :param builders: dictionary mapping attribute names to functions
+        that take no arguments and return the attribute value
+    """
+
+    def __getattr__(name):
+        try:
+            build = builders[name]
+        except KeyError:
+            raise AttributeError("module %r has no attribute %r" % (namespace["__name__"], name))
+        else:
+            value = namespace[name] = build()
+            return value
+
+    return __getattr__
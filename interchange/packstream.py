@@ -16,53 +16,198 @@
 # limitations under the License.
 
 
-from codecs import decode
+from array import array
 from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from copy import copy
 from datetime import date, time, datetime, timedelta
 from io import BytesIO
-from struct import pack as struct_pack, unpack as struct_unpack
+from os import cpu_count, name as os_name
+from re import compile as re_compile
+from struct import Struct, error as struct_error, pack as struct_pack
+from sys import byteorder, version_info
 
-from pytz import FixedOffset, timezone, utc
+from pytz import FixedOffset, timezone
 import six
 
+from interchange._lazy import lazy_attributes
 from interchange.geo import Point
 from interchange.time import Duration, Date, Time, DateTime, UnixEpoch
 
 
-INT_DATA = {}
-for n in range(-0x8000, 0x8000):
-    if -0x10 <= n < 0x80:
-        INT_DATA[n] = struct_pack(">b", n)
-    elif -0x80 <= n < -0x10:
-        INT_DATA[n] = b"\xC8" + struct_pack(">b", n)
-    else:
-        INT_DATA[n] = b"\xC9" + struct_pack(">h", n)
+class _IntData(dict):
+    """ Complete encodings of integers that fit into 16 bits, keyed by
+    value. Entries are generated on first use, so only values that are
+    actually packed take up memory.
+    """
 
-BYTES_S_HEAD = [b"\xCC" + struct_pack(">B", value) for value in range(0x100)]
-BYTES_M_HEAD = [b"\xCD" + struct_pack(">H", value) for value in range(0x10000)]
+    def __missing__(self, n):
+        if -0x10 <= n < 0x80:
+            data = struct_pack(">b", n)
+        elif -0x80 <= n < -0x10:
+            data = b"\xC8" + struct_pack(">b", n)
+        else:
+            data = b"\xC9" + struct_pack(">h", n)
+        self[n] = data
+        return data
 
-STR_S_HEAD = [b"\xD0" + struct_pack(">B", value) for value in range(0x100)]
-STR_M_HEAD = [b"\xD1" + struct_pack(">H", value) for value in range(0x10000)]
 
-LIST_S_HEAD = [b"\xD4" + struct_pack(">B", value) for value in range(0x100)]
-LIST_M_HEAD = [b"\xD5" + struct_pack(">H", value) for value in range(0x10000)]
+_INT_DATA = _IntData()
 
+# Every single-byte value, for writing tiny headers and structure tags
+# without building a new object each time
+SINGLE_BYTES = [struct_pack(">B", value) for value in range(0x100)]
+
+BYTES_S_HEAD = [b"\xCC" + struct_pack(">B", value) for value in range(0x100)]
+STR_S_HEAD = [b"\xD0" + struct_pack(">B", value) for value in range(0x100)]
+LIST_S_HEAD = [b"\xD4" + struct_pack(">B", value) for value in range(0x100)]
 DICT_S_HEAD = [b"\xD8" + struct_pack(">B", value) for value in range(0x100)]
-DICT_M_HEAD = [b"\xD9" + struct_pack(">H", value) for value in range(0x10000)]
 
 UNPACKED_UINT_8 = {bytes(bytearray([x])): x for x in range(0x100)}
-UNPACKED_UINT_16 = {struct_pack(">H", x): x for x in range(0x10000)}
 
 UNPACKED_MARKERS = {b"\xC0": None, b"\xC2": False, b"\xC3": True}
 UNPACKED_MARKERS.update({bytes(bytearray([z])): z for z in range(0x00, 0x80)})
 UNPACKED_MARKERS.update({bytes(bytearray([z + 256])): z for z in range(-0x10, 0x00)})
 
 
+# Larger lookup tables, kept for backward compatibility, but built
+# only on first access (see `lazy_attributes`) as they take time
+# and several megabytes of memory to create. Encoding and decoding
+# do not use these tables.
+_LAZY_TABLES = {
+    "INT_DATA": lambda: {n: _INT_DATA[n] for n in range(-0x8000, 0x8000)},
+    "BYTES_M_HEAD": lambda: [b"\xCD" + struct_pack(">H", value) for value in range(0x10000)],
+    "STR_M_HEAD": lambda: [b"\xD1" + struct_pack(">H", value) for value in range(0x10000)],
+    "LIST_M_HEAD": lambda: [b"\xD5" + struct_pack(">H", value) for value in range(0x10000)],
+    "DICT_M_HEAD": lambda: [b"\xD9" + struct_pack(">H", value) for value in range(0x10000)],
+    "UNPACKED_UINT_16": lambda: {struct_pack(">H", x): x for x in range(0x10000)},
+}
+
+__getattr__ = lazy_attributes(globals(), _LAZY_TABLES)
+
+
+UINT_16 = Struct(">H")
+UINT_32 = Struct(">I")
+INT_8 = Struct(">b")
+INT_16 = Struct(">h")
+INT_32 = Struct(">i")
+INT_64 = Struct(">q")
+FLOAT_64 = Struct(">d")
+
+# Marker byte followed by a value, for writing both in one go
+MARKED_UINT_16 = Struct(">BH")
+MARKED_UINT_32 = Struct(">BI")
+MARKED_INT_32 = Struct(">Bi")
+MARKED_INT_64 = Struct(">Bq")
+MARKED_FLOAT_64 = Struct(">Bd")
+
+
 INT64_MIN = -(2 ** 63)
 INT64_MAX = 2 ** 63
 
 
 UNIX_EPOCH_DATE_ORDINAL = UnixEpoch.to_ordinal()
+UNIX_EPOCH_CLOCK_TIME = UnixEpoch.to_clock_time()
+
+
+# Minimum list size for which bulk encoding is attempted
+BULK_THRESHOLD = 0x10
+
+# Markers of integers and floats with a fixed-width payload, mapped to
+# the total encoded size of each value and the matching array typecode
+FIXED_WIDTH_NUMERIC_MARKERS = {
+    0xC1: (9, "d"),
+    0xC8: (2, "q"),
+    0xC9: (3, "q"),
+    0xCA: (5, "q"),
+    0xCB: (9, "q"),
+}
+
+TINY_INT_MARKERS = bytes(bytearray(range(0x00, 0x80))) + bytes(bytearray(range(0xF0, 0x100)))
+
+# Translation table mapping the most significant byte of a two's
+# complement integer to the byte used to sign-extend it
+SIGN_EXTENSION = bytes(bytearray([0x00] * 0x80 + [0xFF] * 0x80))
+
+INTEGER_TYPECODES = "bBhHiIlLqQ"
+FLOAT_TYPECODES = "fd"
+
+
+def _encode_integer(value):
+    if -0x8000 <= value < 0x8000:
+        return _INT_DATA[value]
+    elif -0x80000000 <= value < 0x80000000:
+        return MARKED_INT_32.pack(0xCA, value)
+    elif INT64_MIN <= value < INT64_MAX:
+        return MARKED_INT_64.pack(0xCB, value)
+    else:
+        raise ValueError("Integer %s out of range" % value)
+
+
+def _encode_integers(values):
+    """ Encode a non-empty sequence of integers in one step, choosing
+    the narrowest approach that the range of values allows.
+    """
+    lo = min(values)
+    hi = max(values)
+    if -0x10 <= lo and hi < 0x80:
+        # All TINY_INT, which is just the two's complement byte
+        return array("b", values).tobytes()
+    elif -0x8000 <= lo and hi < 0x8000:
+        return b"".join(map(_INT_DATA.__getitem__, values))
+    else:
+        return b"".join(map(_encode_integer, values))
+
+
+def _encode_floats(values):
+    """ Encode a non-empty sequence of floats in one step, by
+    interleaving a marker byte into the big-endian IEEE 754 data.
+    """
+    n = len(values)
+    doubles = array("d", values)
+    if byteorder == "little":
+        doubles.byteswap()
+    raw = doubles.tobytes()
+    data = bytearray(9 * n)
+    data[0::9] = b"\xC1" * n
+    for i in range(8):
+        data[i + 1::9] = raw[i::8]
+    return data
+
+
+def _encode_dates(values):
+    return b"".join([b"\xB1D" + _encode_integer(value.toordinal() - UNIX_EPOCH_DATE_ORDINAL)
+                     for value in values])
+
+
+def _buffer_to_array(obj):
+    """ Copy a one-dimensional numeric buffer, such as a NumPy array,
+    into an :class:`array.array`. Buffers of any other shape or format
+    are converted to (possibly nested) lists instead.
+    """
+    view = memoryview(obj)
+    typecode = view.format.lstrip("@")
+    if (view.ndim == 1 and view.c_contiguous and len(typecode) == 1 and
+            typecode in INTEGER_TYPECODES + FLOAT_TYPECODES):
+        values = array(typecode)
+        values.frombytes(view.cast("B"))
+        return values
+    else:
+        return view.tolist()
+
+
+def _typed_list(values):
+    """ Convert a list of decoded values to an :class:`array.array` if
+    these are all integers or all floats, as for `typed_lists`.
+    Otherwise, return the list unchanged.
+    """
+    types = set(map(type, values))
+    if types == {int}:
+        return array("q", values)
+    elif types == {float}:
+        return array("d", values)
+    else:
+        return values
 
 
 class Structure(object):
@@ -93,7 +238,202 @@ class Structure(object):
         self.fields[key] = value
 
 
+class _LRUCache(object):
+    """ Base class for bounded caches that evict their least recently
+    used entries first. Subclasses look entries up themselves, so as
+    to keep cache hits cheap, and call `_add` on a miss. The size of
+    each entry, as counted against `max_bytes`, is given by `sizeof`,
+    called with its key and value.
+    """
+
+    def __init__(self, sizeof, max_entries=1024, max_bytes=None):
+        if max_entries < 1:
+            raise ValueError("Maximum number of entries must be positive")
+        self._sizeof = sizeof
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def nbytes(self):
+        """ Total encoded size of the strings held.
+        """
+        return self._nbytes
+
+    def clear(self):
+        """ Remove all entries from the cache. The `hits`, `misses`
+        and `evictions` counters are left as they are.
+        """
+        self._entries.clear()
+        self._nbytes = 0
+
+    def _add(self, key, value):
+        size = self._sizeof(key, value)
+        max_bytes = self.max_bytes
+        if max_bytes is not None and size > max_bytes:
+            return
+        entries = self._entries
+        entries[key] = value
+        self._nbytes += size
+        while len(entries) > self.max_entries or (max_bytes is not None and
+                                                  self._nbytes > max_bytes):
+            self._nbytes -= self._sizeof(*entries.popitem(last=False))
+            self.evictions += 1
+
+
+def _decode_utf8(data):
+    return str(data, "utf-8")
+
+
+def _utf8_decoder(data):
+    """ Return the fastest available function for decoding UTF-8 text
+    from slices of a buffer.
+    """
+    # The decode methods of bytes and bytearray avoid the codec lookup
+    # of codecs.decode, and go straight to the UTF-8 decoder, which has
+    # its own fast path for ASCII text
+    sliced = type(data[:0])
+    if sliced is bytes or sliced is bytearray:
+        return sliced.decode
+    else:
+        return _decode_utf8
+
+
+class StringCache(_LRUCache):
+    """ Bounded cache of decoded strings, keyed by their UTF-8 encoded
+    bytes. When full, the least recently used strings are evicted to
+    make room for others.
+
+    A cache can be given to an :class:`.Unpacker` to decode repeated
+    dictionary keys or short string values, so that every occurrence
+    of such a string shares a single string object. The same cache
+    can be shared by several unpackers, for example all those decoding
+    messages from one connection. The `hits`, `misses` and `evictions`
+    counters record how effective the cache is for a given workload.
+
+    :param max_entries: maximum number of strings to hold
+    :param max_bytes: maximum total encoded size of the strings held,
+        or :const:`None` for no limit; a string larger than this is
+        never cached
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        super(StringCache, self).__init__(lambda data, value: len(data),
+                                          max_entries, max_bytes)
+
+    def decode(self, data):
+        """ Return the string encoded by the UTF-8 bytes given, from the
+        cache if present, otherwise decoding and caching it.
+
+        :param data: :class:`bytes` to decode
+        """
+        try:
+            value = self._entries[data]
+        except KeyError:
+            self.misses += 1
+            value = data.decode("utf-8")
+            self._add(data, value)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(data)
+        return value
+
+
+class EncodedStringCache(_LRUCache):
+    """ Bounded cache of the complete PackStream encodings of strings,
+    header included, keyed by string. When full, the least recently
+    used encodings are evicted to make room for others.
+
+    A cache can be given to a :class:`.Packer`, so that dictionary keys
+    and other strings packed repeatedly are each written with a single
+    append, rather than being encoded anew every time. The `hits`,
+    `misses` and `evictions` counters record how effective the cache
+    is for a given workload.
+
+    :param max_entries: maximum number of strings to hold
+    :param max_bytes: maximum total size of the encodings held, or
+        :const:`None` for no limit; a string with a larger encoding
+        than this is never cached
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        super(EncodedStringCache, self).__init__(lambda value, data: len(data),
+                                                 max_entries, max_bytes)
+
+    def encode(self, value):
+        """ Return the PackStream encoding of a string, from the cache
+        if present, otherwise encoding and caching it.
+
+        :param value: string to encode
+        """
+        try:
+            data = self._entries[value]
+        except KeyError:
+            self.misses += 1
+            data = _encode_string(value)
+            self._add(value, data)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(value)
+        return data
+
+
+def _encode_string(value):
+    return _encode_utf8(value.encode("utf-8"))
+
+
+def _encode_utf8(data):
+    size = len(data)
+    if size < 0x10:
+        return SINGLE_BYTES[0x80 + size] + data
+    elif size < 0x100:
+        return STR_S_HEAD[size] + data
+    elif size < 0x10000:
+        return MARKED_UINT_16.pack(0xD1, size) + data
+    elif size < 0x100000000:
+        return MARKED_UINT_32.pack(0xD2, size) + data
+    else:
+        raise ValueError("String too large")
+
+
 class Packer(object):
+    """ Encoder for PackStream values.
+
+    Encoded data is written to the `buffer` given, which may be a
+    file-like object or a :class:`bytearray` (which is appended to).
+    If no buffer is given, the packer writes to an internal buffer of
+    its own, reserving `capacity` bytes up front; the data packed so
+    far can then be accessed without copying through :meth:`.view`,
+    and the packer reused for another message after :meth:`.reset`.
+
+    Values of types other than those natively supported can be packed
+    by registering a dehydrator function for each such type, through
+    the `dehydrators` argument. A dehydrator is called with the value
+    to be packed as its only argument, and should return a value that
+    can be packed in its place, typically a :class:`.Structure`. A
+    dehydrator can also be registered for a natively supported type,
+    in which case it is used instead of the native encoding.
+
+    :param buffer: file-like object or bytearray to which encoded data
+        is written, or :const:`None` to use an internal buffer
+    :param version: Bolt protocol version, which governs the types
+        that can be packed
+    :param dehydrators: dictionary mapping types to dehydrator
+        functions
+    :param capacity: number of bytes to reserve for the internal buffer
+    :param string_cache: :class:`.EncodedStringCache` through which to
+        encode strings, including dictionary keys
+    """
 
     integer_types = six.integer_types
     text_type = six.text_type
@@ -101,57 +441,170 @@ class Packer(object):
     list_type = list
     dict_type = dict
 
-    def __init__(self, buffer, version=()):
+    # Temporal and spatial types, supported from Bolt 2 onwards
+    extended_types = (datetime, DateTime, date, Date, time, Time, timedelta, Duration, Point)
+
+    def __init__(self, buffer=None, version=(), dehydrators=None, capacity=0,
+                 string_cache=None):
+        if buffer is None:
+            # The internal buffer is overwritten from the start rather
+            # than truncated, so that its capacity is kept for reuse
+            buffer = BytesIO()
+            if capacity:
+                buffer.write(bytes(capacity))
+                buffer.seek(0)
+            self._internal = True
+        else:
+            self._internal = False
         self._buffer = buffer
-        self._write = self._buffer.write
+        if isinstance(buffer, bytearray):
+            self._write = buffer.extend
+        else:
+            self._write = buffer.write
         self.version = version
+        self._dehydrators = dict(dehydrators) if dehydrators else {}
+        self._string_cache = string_cache
+        if string_cache is not None:
+            # Dictionary keys are packed through this method too
+            self._pack_unicode = self._pack_cached_unicode
+        self._reset_encoders()
+
+    def _reset_encoders(self):
+        # Cache of type -> encoder function, starting out with the
+        # natively supported types and extended as other types are
+        # resolved (see `_resolve_encoder`)
+        self._encoders = encoders = self._native_encoders.copy()
+        if self._string_cache is not None:
+            encoders[self.text_type] = Packer._pack_cached_unicode
+        if self._dehydrators:
+            # Native types with a dehydrator are left to be resolved to it
+            for t in list(encoders):
+                if self._find_dehydrator(t) is not None:
+                    del encoders[t]
+
+    def register_dehydrator(self, cls, dehydrator):
+        """ Register a dehydrator function for values of a given type
+        (and its subclasses), replacing any existing dehydrator for
+        that type.
+
+        :param cls: type of value to be dehydrated
+        :param dehydrator: function that accepts a value of type `cls`
+            and returns a packable value to use in its place
+        """
+        self._dehydrators[cls] = dehydrator
+        self._reset_encoders()
 
-    def pack(self, value):
-        t = type(value)
+    def view(self):
+        """ Return a :class:`memoryview` of the encoded data, without
+        copying it.
 
-        # String (Unicode)
-        if t is self.text_type:
-            self._pack_unicode(value)
+        For an internal buffer, this covers the data packed so far; for
+        a bytearray buffer, it covers the whole bytearray. The view must
+        be released before any more values are packed, as a buffer
+        cannot be resized while exported.
 
-        # List
-        elif t is self.list_type or t is tuple:
-            self._pack_list(value)
+        :raises TypeError: if the packer writes to a file-like object
+        """
+        if self._internal:
+            with self._buffer.getbuffer() as data:
+                return data[:self._buffer.tell()]
+        elif isinstance(self._buffer, bytearray):
+            return memoryview(self._buffer)
+        else:
+            raise TypeError("Cannot view data written to %r" % self._buffer)
 
-        # Integer
-        elif t in self.integer_types:
-            self._pack_integer(value)
+    def reset(self):
+        """ Discard all data packed so far, so that the packer can be
+        reused for a new message. The internal buffer keeps its
+        capacity, so a long-lived packer settles into encoding each
+        message without further allocation.
 
-        # Float
-        elif t is float:
-            self._write(b"\xC1")
-            self._write(struct_pack(">d", value))
+        :raises TypeError: if the packer writes to a file-like object
+        """
+        if self._internal:
+            self._buffer.seek(0)
+        elif isinstance(self._buffer, bytearray):
+            del self._buffer[:]
+        else:
+            raise TypeError("Cannot reset data written to %r" % self._buffer)
 
-        # Boolean
-        elif value is True:
-            self._write(b"\xC3")
-        elif value is False:
-            self._write(b"\xC2")
+    @property
+    def size(self):
+        """ Number of bytes packed since the packer was created or
+        last reset.
+        """
+        if self._internal:
+            return self._buffer.tell()
+        elif isinstance(self._buffer, bytearray):
+            return len(self._buffer)
+        else:
+            raise TypeError("Cannot measure data written to %r" % self._buffer)
 
-        # None
-        elif value is None:
-            self._write(b"\xC0")  # NULL
+    @property
+    def capacity(self):
+        """ Number of bytes that can be packed without growing the
+        buffer.
+        """
+        if self._internal:
+            with self._buffer.getbuffer() as data:
+                return data.nbytes
+        elif isinstance(self._buffer, bytearray):
+            # One byte of the allocation is reserved for a trailing null
+            return max(self._buffer.__alloc__() - 1, 0)
+        else:
+            raise TypeError("Cannot measure data written to %r" % self._buffer)
 
-        # Byte array
-        elif t is self.bytearray_type:
-            self._pack_bytearray(value)
+    def pack(self, value):
+        try:
+            encoder = self._encoders[type(value)]
+        except KeyError:
+            encoder = self._resolve_encoder(type(value))
+        encoder(self, value)
 
-        # String (UTF-8)
-        elif t is bytes:
-            self._pack_utf8(value)
+    def _resolve_encoder(self, t):
+        """ Find the encoder function for values of a type that is not
+        yet in the cache, and cache it.
+        """
+        dehydrator = self._find_dehydrator(t)
+        if dehydrator is not None:
+            encoder = self._dehydrating_encoder(dehydrator)
+        elif issubclass(t, self.extended_types):
+            encoder = self._resolve_extended_encoder(t)
+        else:
+            # Subclasses of natively supported types
+            for cls in t.__mro__[1:-1]:
+                if cls in self._encoders:
+                    encoder = self._encoders[cls]
+                    break
+            else:
+                if issubclass(t, self.dict_type):
+                    encoder = Packer._pack_dict
+                else:
+                    raise TypeError("Values of type %s are not supported" % t)
+        self._encoders[t] = encoder
+        return encoder
 
-        # Dictionary
-        elif t is dict or t is OrderedDict or isinstance(value, self.dict_type):
-            self._pack_dict(value)
+    def _find_dehydrator(self, t):
+        if self._dehydrators:
+            for cls in t.__mro__:
+                if cls in self._dehydrators:
+                    return self._dehydrators[cls]
+        return None
+
+    @classmethod
+    def _dehydrating_encoder(cls, dehydrator):
+
+        def encoder(packer, value):
+            packer.pack(dehydrator(value))
+
+        return encoder
+
+    def _resolve_extended_encoder(self, t):
 
         # Bolt 2 introduced temporal and spatial types
-        elif self.version < (2, 0):
+        if self.version < (2, 0):
             raise TypeError("Values of type %s are not supported "
-                            "by Bolt %s" % (type(value), ".".join(self.version)))
+                            "by Bolt %s" % (t, ".".join(map(str, self.version))))
 
         # DateTime
         #
@@ -159,67 +612,71 @@ class Packer(object):
         # datetime.date class, so this needs to be listed first
         # to avoid objects being encoded incorrectly.
         #
-        elif isinstance(value, datetime):
-            self._pack_datetime(DateTime.from_native(value))
-        elif isinstance(value, DateTime):
-            self._pack_datetime(value)
+        elif issubclass(t, datetime):
+            return Packer._pack_native_datetime
+        elif issubclass(t, DateTime):
+            return Packer._pack_datetime
 
         # Date
-        elif isinstance(value, (date, Date)):
-            self._write(b"\xB1D")
-            self._pack_integer(value.toordinal() - UNIX_EPOCH_DATE_ORDINAL)
+        elif issubclass(t, (date, Date)):
+            return Packer._pack_date
 
         # Time
-        elif isinstance(value, (time, Time)):
-            self._pack_time(value)
+        elif issubclass(t, (time, Time)):
+            return Packer._pack_time
 
         # TimeDelta
-        elif isinstance(value, timedelta):
-            self._write(b"\xB4E")
-            self._pack_integer(0)                                   # months
-            self._pack_integer(value.days)                          # days
-            self._pack_integer(value.seconds)                       # seconds
-            self._pack_integer(1000 * value.microseconds)           # nanoseconds
+        elif issubclass(t, timedelta):
+            return Packer._pack_timedelta
 
         # Duration
-        elif isinstance(value, Duration):
-            self._write(b"\xB4E")
-            self._pack_integer(value.months)                        # months
-            self._pack_integer(value.days)                          # days
-            self._pack_integer(value.seconds)                       # seconds
-            self._pack_integer(int(1000000000 * value.subseconds))  # nanoseconds
+        elif issubclass(t, Duration):
+            return Packer._pack_duration
 
         # Point
-        elif isinstance(value, Point):
-            self._pack_point(value)
+        else:
+            return Packer._pack_point
 
-        # Other
+    def _pack_null(self, value):
+        self._write(b"\xC0")
+
+    def _pack_boolean(self, value):
+        if value:
+            self._write(b"\xC3")
         else:
-            raise TypeError("Values of type %s are not supported" % type(value))
+            self._write(b"\xC2")
+
+    def _pack_float(self, value):
+        self._write(MARKED_FLOAT_64.pack(0xC1, value))
 
     def _pack_unicode(self, value):
-        # Count the number of chars and handle boundary cases
-        size = len(value)
-        if size == 0:
-            self._write(b"\x80")
+        # Encode first, then write the header for short strings inline,
+        # which is the common case, rather than through `_pack_utf8`
+        data = value.encode()
+        size = len(data)
+        if size < 0x10:
+            self._write(SINGLE_BYTES[0x80 + size])
+        elif size < 0x100:
+            self._write(STR_S_HEAD[size])
+        else:
+            self._pack_utf8(data)
             return
-        elif size >= 0x100000000:
-            raise ValueError("String too large")
-        # Count the number of bytes when encoded as UTF-8
-        self._pack_utf8(value.encode("utf-8"))
+        self._write(data)
+
+    def _pack_cached_unicode(self, value):
+        self._write(self._string_cache.encode(value))
 
     def _pack_utf8(self, value):
         size = len(value)
         # Write the string header
         if size < 0x10:
-            self._write(bytearray([0x80 + size]))
+            self._write(SINGLE_BYTES[0x80 + size])
         elif size < 0x100:
             self._write(STR_S_HEAD[size])
         elif size < 0x10000:
-            self._write(STR_M_HEAD[size])
+            self._write(MARKED_UINT_16.pack(0xD1, size))
         elif size < 0x100000000:
-            self._write(b"\xD2")
-            self._write(struct_pack(">I", size))
+            self._write(MARKED_UINT_32.pack(0xD2, size))
         else:
             raise ValueError("String too large")
         # Write the string content
@@ -231,28 +688,69 @@ class Packer(object):
             self._write(b"\x90")
             return
         elif size < 0x10:
-            self._write(bytearray([0x90 + size]))
+            self._write(SINGLE_BYTES[0x90 + size])
         elif size < 0x100:
             self._write(LIST_S_HEAD[size])
         elif size < 0x10000:
-            self._write(LIST_M_HEAD[size])
+            self._write(MARKED_UINT_16.pack(0xD5, size))
         elif size < 0x100000000:
-            self._write(b"\xD6")
-            self._write(struct_pack(">I", size))
+            self._write(MARKED_UINT_32.pack(0xD6, size))
         else:
             raise ValueError("List too large")
-        for item in value:
+        self._pack_items(value)
+
+    def _pack_items(self, items):
+        """ Pack each item of a non-empty sequence. Arrays, and lists of
+        sufficient size that contain only integers, only floats or only
+        dates, are encoded in bulk, unless a dehydrator is registered
+        for the item type. Everything else is packed item by item.
+        """
+        if type(items) is array and self._find_dehydrator(type(items[0])) is None:
+            if items.typecode in INTEGER_TYPECODES:
+                self._write(_encode_integers(items))
+                return
+            elif items.typecode in FLOAT_TYPECODES:
+                self._write(_encode_floats(items))
+                return
+        elif len(items) >= BULK_THRESHOLD:
+            types = set(map(type, items))
+            if len(types) == 1 and self._find_dehydrator(next(iter(types))) is None:
+                t = types.pop()
+                if t in self.integer_types:
+                    self._write(_encode_integers(items))
+                    return
+                elif t is float:
+                    self._write(_encode_floats(items))
+                    return
+                elif (t is date or t is Date) and self.version >= (2, 0):
+                    self._write(_encode_dates(items))
+                    return
+        for item in items:
             self.pack(item)
 
+    def pack_many(self, values):
+        """ Pack a sequence of values as a single list.
+
+        As well as lists and tuples, this accepts :class:`array.array`
+        objects and any other object that supports the buffer protocol
+        (such as a one-dimensional NumPy array). Homogeneous sequences
+        of integers, floats or dates are encoded in bulk, without
+        dispatching on the type of each item, but produce exactly the
+        same bytes as :meth:`.pack` would for the equivalent list.
+
+        :param values: sequence of values to pack
+        """
+        if not isinstance(values, (list, tuple, array)):
+            values = _buffer_to_array(values)
+        self._pack_list(values)
+
     def _pack_integer(self, value):
         if -0x8000 <= value < 0x8000:
-            self._write(INT_DATA[value])
+            self._write(_INT_DATA[value])
         elif -0x80000000 <= value < 0x80000000:
-            self._write(b"\xCA")
-            self._write(struct_pack(">i", value))
+            self._write(MARKED_INT_32.pack(0xCA, value))
         elif INT64_MIN <= value < INT64_MAX:
-            self._write(b"\xCB")
-            self._write(struct_pack(">q", value))
+            self._write(MARKED_INT_64.pack(0xCB, value))
         else:
             raise ValueError("Integer %s out of range" % value)
 
@@ -261,14 +759,13 @@ class Packer(object):
         if size == 0:
             self._write(b"\xA0")
         elif size < 0x10:
-            self._write(bytearray([0xA0 + size]))
+            self._write(SINGLE_BYTES[0xA0 + size])
         elif size < 0x100:
             self._write(DICT_S_HEAD[size])
         elif size < 0x10000:
-            self._write(DICT_M_HEAD[size])
+            self._write(MARKED_UINT_16.pack(0xD9, size))
         elif size < 0x100000000:
-            self._write(b"\xDA")
-            self._write(struct_pack(">I", size))
+            self._write(MARKED_UINT_32.pack(0xDA, size))
         else:
             raise ValueError("Dictionary too large")
         for key, item in value.items():
@@ -287,14 +784,40 @@ class Packer(object):
         if size < 0x100:
             self._write(BYTES_S_HEAD[size])
         elif size < 0x10000:
-            self._write(BYTES_M_HEAD[size])
+            self._write(MARKED_UINT_16.pack(0xCD, size))
         elif size < 0x100000000:
-            self._write(b"\xCE")
-            self._write(struct_pack(">I", size))
+            self._write(MARKED_UINT_32.pack(0xCE, size))
         else:
             raise ValueError("Byte array too large")
         self._write(value)
 
+    def _pack_structure(self, value):
+        size = len(value.fields)
+        if size >= 0x10:
+            raise ValueError("Structure too large")
+        self._write(SINGLE_BYTES[0xB0 + size])
+        self._write(SINGLE_BYTES[_struct_tag(value.tag)])
+        for field in value.fields:
+            self.pack(field)
+
+    def _pack_date(self, value):
+        self._write(b"\xB1D")
+        self._pack_integer(value.toordinal() - UNIX_EPOCH_DATE_ORDINAL)
+
+    def _pack_timedelta(self, value):
+        self._write(b"\xB4E")
+        self._pack_integer(0)                                   # months
+        self._pack_integer(value.days)                          # days
+        self._pack_integer(value.seconds)                       # seconds
+        self._pack_integer(1000 * value.microseconds)           # nanoseconds
+
+    def _pack_duration(self, value):
+        self._write(b"\xB4E")
+        self._pack_integer(value.months)                        # months
+        self._pack_integer(value.days)                          # days
+        self._pack_integer(value.seconds)                       # seconds
+        self._pack_integer(int(1000000000 * value.subseconds))  # nanoseconds
+
     def _pack_time(self, t):
         try:
             nanoseconds = int(t.ticks * 1000000000)
@@ -309,26 +832,27 @@ class Packer(object):
             self._write(b"\xB1t")
             self._pack_integer(nanoseconds)
 
+    def _pack_native_datetime(self, value):
+        self._pack_datetime(DateTime.from_native(value))
+
     def _pack_datetime(self, dt):
         tz = dt.tzinfo
+        # Clock times ignore the time zone, so all three variants can
+        # be measured against the same (naive) Unix epoch
+        seconds, nanoseconds = dt.to_clock_time() - UNIX_EPOCH_CLOCK_TIME
         if tz is None:
             # without time zone
-            seconds, nanoseconds = utc.localize(dt).to_clock_time() - UnixEpoch.to_clock_time()
             self._write(b"\xB2d")
             self._pack_integer(seconds)
             self._pack_integer(nanoseconds)
         elif hasattr(tz, "zone") and tz.zone:
             # with named time zone
-            zone_epoch = DateTime(1970, 1, 1, tzinfo=dt.tzinfo)
-            seconds, nanoseconds = dt.to_clock_time() - zone_epoch.to_clock_time()
             self._write(b"\xB3f")
             self._pack_integer(seconds)
             self._pack_integer(nanoseconds)
             self.pack(tz.zone)
         else:
             # with time offset
-            zone_epoch = DateTime(1970, 1, 1, tzinfo=dt.tzinfo)
-            seconds, nanoseconds = dt.to_clock_time() - zone_epoch.to_clock_time()
             self._write(b"\xB3F")
             self._pack_integer(seconds)
             self._pack_integer(nanoseconds)
@@ -336,7 +860,7 @@ class Packer(object):
 
     def _pack_point(self, p):
         dim = len(p)
-        self._write(bytearray([0xB1 + dim]))
+        self._write(SINGLE_BYTES[0xB1 + dim])
         if dim == 2:
             self._write(b"X")
         elif dim == 3:
@@ -347,280 +871,1555 @@ class Packer(object):
         for value in p:
             self.pack(value)
 
+    # Encoders for the natively supported types, copied into the
+    # encoder cache of each packer (see `_reset_encoders`)
+    _native_encoders = {
+        text_type: _pack_unicode,
+        list_type: _pack_list,
+        tuple: _pack_list,
+        array: _pack_list,
+        float: _pack_float,
+        bool: _pack_boolean,
+        type(None): _pack_null,
+        bytearray_type: _pack_bytearray,
+        bytes: _pack_utf8,
+        dict: _pack_dict,
+        OrderedDict: _pack_dict,
+        Structure: _pack_structure,
+    }
+    _native_encoders.update(dict.fromkeys(integer_types, _pack_integer))
+
+
+# Types that dictionary keys may have, excluding subclasses
+KEY_TYPES = frozenset([six.text_type, bytes])
+
+
+class RecordEncoder(object):
+    """ Encoder for dictionaries that share the same keys, in the same
+    order, such as records returned by a query.
+
+    The header and keys of such dictionaries are encoded once, up
+    front, into a segment of bytes to precede each value. Each record
+    is then packed by writing those segments in turn, each followed by
+    the corresponding value, without examining or encoding the keys
+    again. The output is identical to that of :meth:`.Packer.pack`.
+
+    The keys may be given, or otherwise are taken from the first record
+    packed. Anything other than a plain dictionary with exactly those
+    keys, in that order, is packed by the packer as usual.
+
+    :param packer: :class:`.Packer` through which to write records
+    :param keys: sequence of keys, as strings or UTF-8 encoded bytes
+    """
+
+    def __init__(self, packer, keys=None):
+        self._packer = packer
+        self._keys = None
+        self._segments = None
+        if keys is not None:
+            self._learn(keys)
+
+    @property
+    def keys(self):
+        """ Keys of the records that this encoder is able to pack, or
+        :const:`None` if not yet known.
+        """
+        return self._keys
 
-class Unpacker(object):
+    def _learn(self, keys):
+        keys = tuple(keys)
+        segments = []
+        for key in keys:
+            t = type(key)
+            if t is six.text_type:
+                segments.append(_encode_string(key))
+            elif t is bytes:
+                segments.append(_encode_utf8(key))
+            else:
+                raise TypeError("Dictionary keys must be "
+                                "of type %r or bytes" % six.text_type)
+        size = len(keys)
+        if size == 0:
+            header = b"\xA0"
+        elif size < 0x10:
+            header = SINGLE_BYTES[0xA0 + size]
+        elif size < 0x100:
+            header = DICT_S_HEAD[size]
+        elif size < 0x10000:
+            header = MARKED_UINT_16.pack(0xD9, size)
+        else:
+            header = MARKED_UINT_32.pack(0xDA, size)
+        if segments:
+            segments[0] = header + segments[0]
+        self._keys = keys
+        self._header = header
+        self._segments = segments
+
+    def pack(self, record):
+        """ Pack a single record.
+
+        :param record: dictionary to pack
+        """
+        packer = self._packer
+        if type(record) is not dict or packer._find_dehydrator(dict) is not None:
+            # Including subclasses, which may have a dehydrator
+            packer.pack(record)
+            return
+        if self._keys is None:
+            self._learn(record)
+        if tuple(record) != self._keys or not KEY_TYPES.issuperset(map(type, record)):
+            # Including keys equal to those expected, but of subclasses
+            # of str or bytes, which the packer rejects
+            packer.pack(record)
+            return
+        if not self._segments:
+            packer._write(self._header)
+            return
+        write = packer._write
+        pack = packer.pack
+        for segment, value in zip(self._segments, record.values()):
+            write(segment)
+            pack(value)
+
+    def pack_many(self, records):
+        """ Pack a sequence of records as a single list.
+
+        :param records: sequence of dictionaries to pack
+        """
+        packer = self._packer
+        size = len(records)
+        if size < 0x10:
+            packer._write(SINGLE_BYTES[0x90 + size])
+        elif size < 0x100:
+            packer._write(LIST_S_HEAD[size])
+        elif size < 0x10000:
+            packer._write(MARKED_UINT_16.pack(0xD5, size))
+        elif size < 0x100000000:
+            packer._write(MARKED_UINT_32.pack(0xD6, size))
+        else:
+            raise ValueError("List too large")
+        pack = self.pack
+        for record in records:
+            pack(record)
+
+
+def hydrate_date(days):
+    """ Hydrator for `Date` values.
+
+    :param days:
+    :return: Date
+    """
+    return Date.from_ordinal(UNIX_EPOCH_DATE_ORDINAL + days)
+
+
+def hydrate_time(nanoseconds, tz=None):
+    """ Hydrator for `Time` and `LocalTime` values.
+
+    :param nanoseconds:
+    :param tz:
+    :return: Time
+    """
+    seconds, nanoseconds = map(int, divmod(nanoseconds, 1000000000))
+    minutes, seconds = map(int, divmod(seconds, 60))
+    hours, minutes = map(int, divmod(minutes, 60))
+    seconds = (1000000000 * seconds + nanoseconds) / 1000000000
+    t = Time(hours, minutes, seconds)
+    if tz is None:
+        return t
+    tz_offset_minutes, tz_offset_seconds = divmod(tz, 60)
+    zone = FixedOffset(tz_offset_minutes)
+    return zone.localize(t)
+
+
+def hydrate_datetime(seconds, nanoseconds, tz=None):
+    """ Hydrator for `DateTime` and `LocalDateTime` values.
+
+    :param seconds:
+    :param nanoseconds:
+    :param tz:
+    :return: datetime
+    """
+    minutes, seconds = map(int, divmod(seconds, 60))
+    hours, minutes = map(int, divmod(minutes, 60))
+    days, hours = map(int, divmod(hours, 24))
+    seconds = (1000000000 * seconds + nanoseconds) / 1000000000
+    t = DateTime.combine(Date.from_ordinal(UNIX_EPOCH_DATE_ORDINAL + days),
+                         Time(hours, minutes, seconds))
+    if tz is None:
+        return t
+    if isinstance(tz, int):
+        tz_offset_minutes, tz_offset_seconds = divmod(tz, 60)
+        zone = FixedOffset(tz_offset_minutes)
+    else:
+        zone = timezone(tz)
+    return zone.localize(t)
+
+
+def hydrate_duration(months, days, seconds, nanoseconds):
+    """ Hydrator for `Duration` values.
+
+    :param months:
+    :param days:
+    :param seconds:
+    :param nanoseconds:
+    :return: `duration` namedtuple
+    """
+    return Duration(months=months, days=days, seconds=seconds, nanoseconds=nanoseconds)
+
+
+def hydrate_point(srid, *coordinates):
+    """ Create a new instance of a Point subclass from a raw
+    set of fields. The subclass chosen is determined by the
+    given SRID; a ValueError will be raised if no such
+    subclass can be found.
+    """
+    try:
+        point_class, dim = Point.class_for_srid(srid)
+    except KeyError:
+        point = Point(coordinates)
+        point.srid = srid
+        return point
+    else:
+        if len(coordinates) != dim:
+            raise ValueError("SRID %d requires %d coordinates (%d provided)" % (srid, dim, len(coordinates)))
+        return point_class(coordinates)
+
+
+def _struct_tag(key):
+    """ Normalise a structure tag, given either as an integer or as
+    a single character string or byte, to an integer.
+    """
+    if isinstance(key, six.text_type):
+        key = key.encode("latin-1")
+    if isinstance(key, (bytes, bytearray)):
+        key, = bytearray(key)
+    if not 0 <= key < 0x100:
+        raise ValueError("Structure tag %r out of range" % key)
+    return key
+
+
+# Default mapping of structure tag to hydrator
+HYDRATORS = {
+    0x44: hydrate_date,         # b"D"
+    0x54: hydrate_time,         # b"T"
+    0x74: hydrate_time,         # b"t"
+    0x46: hydrate_datetime,     # b"F"
+    0x64: hydrate_datetime,     # b"d"
+    0x66: hydrate_datetime,     # b"f"
+    0x45: hydrate_duration,     # b"E"
+    0x58: hydrate_point,        # b"X"
+    0x59: hydrate_point,        # b"Y"
+}
 
-    def __init__(self, data, offset=0):
-        if six.PY2:
+
+class Unpacker(object):
+    """ Decoder for PackStream values held in a buffer.
+
+    In zero-copy mode, the data is wrapped in a :class:`memoryview`,
+    which allows any object supporting the buffer protocol (including
+    an :class:`mmap.mmap`) to be decoded without first copying it into
+    a :class:`bytes` object. Strings are decoded directly from the
+    underlying buffer and byte arrays are returned as
+    :class:`memoryview` slices of it, rather than as copies. Note that
+    those slices keep the underlying buffer exported for as long as
+    they are referenced.
+
+    With `typed_lists` enabled, non-empty lists that contain only
+    integers or only floats are returned as :class:`array.array`
+    objects, with typecode ``q`` or ``d`` respectively, instead of as
+    lists. Where every item in such a list shares the same marker, the
+    array is built in bulk directly from the encoded bytes, without
+    creating a Python object for each item.
+
+    Structures are converted into other objects by hydrator functions,
+    looked up by structure tag. Each hydrator is called with the fields
+    of the structure as arguments, and its return value is used in
+    place of the structure. Hydrators for the temporal and spatial
+    types are registered by default (see :data:`.HYDRATORS`), and
+    others can be added, or the defaults overridden, through the
+    `hydrators` argument. Structures without a hydrator are returned
+    as :class:`.Structure` objects.
+
+    In lazy mode, lists and dictionaries are returned as
+    :class:`.LazyList` and :class:`.LazyMap` proxies over the encoded
+    data, rather than being decoded up front. The items of each are
+    located by scanning markers and sizes only, and are decoded one by
+    one as they are accessed. This cannot be combined with
+    `typed_lists`.
+
+    Dictionary keys can be decoded through a :class:`.StringCache`,
+    given as `key_cache`, so that repeated keys share one string
+    object rather than each being decoded anew. This does not apply
+    in lazy mode. Likewise, short string values (of up to 255 bytes)
+    can be decoded through a cache given as `string_cache`.
+
+    :param data: buffer from which to decode
+    :param offset: position of the first byte to decode
+    :param zero_copy: if true, decode directly from the buffer and
+        return byte arrays as :class:`memoryview` slices
+    :param typed_lists: if true, decode homogeneous numeric lists
+        into arrays
+    :param hydrators: dictionary mapping structure tags, either as
+        integers or as single characters, to hydrator functions
+    :param lazy: if true, decode lists and dictionaries lazily
+    :param key_cache: :class:`.StringCache` through which to decode
+        dictionary keys
+    :param string_cache: :class:`.StringCache` through which to decode
+        short string values
+    """
+
+    # Unpacker used to decode items of lazy lists and dictionaries
+    _proxy_unpacker = None
+
+    def __init__(self, data, offset=0, zero_copy=False, typed_lists=False, hydrators=None,
+                 lazy=False, key_cache=None, string_cache=None):
+        if zero_copy:
+            self._data = memoryview(data).cast("B")
+        elif six.PY2:
             self._data = bytearray(data)  # FIXME
         else:
             self._data = data
         self._offset = offset
+        self._zero_copy = zero_copy
+        self._decode_utf8 = _utf8_decoder(self._data)
+        if typed_lists and lazy:
+            raise ValueError("Typed lists cannot be decoded lazily")
+        elif typed_lists:
+            self._handlers = self._typed_handlers
+        elif lazy:
+            self._handlers = self._lazy_handlers
+        self._key_cache = key_cache
+        self._string_cache = string_cache
+        if key_cache is not None or string_cache is not None:
+            self._handlers = handlers = list(self._handlers)
+            if key_cache is not None and not lazy:
+                handlers[0xA0:0xB0] = [Unpacker._unpack_tiny_cached_key_dict] * 0x10
+                handlers[0xD8] = Unpacker._unpack_cached_key_dict_8
+                handlers[0xD9] = Unpacker._unpack_cached_key_dict_16
+                handlers[0xDA] = Unpacker._unpack_cached_key_dict_32
+            if string_cache is not None:
+                handlers[0x81:0x90] = [Unpacker._unpack_tiny_cached_string] * 0x0F
+                handlers[0xD0] = Unpacker._unpack_cached_string_8
+        if hydrators:
+            self._hydrators = dict(HYDRATORS)
+            self._hydrators.update((_struct_tag(tag), hydrator)
+                                   for tag, hydrator in hydrators.items())
+        else:
+            self._hydrators = HYDRATORS
 
     def unpack(self):
         marker = self._data[self._offset]
         self._offset += 1
+        return self._handlers[marker](self, marker)
+
+    def skip(self, count=1):
+        """ Move past the next value, or the next `count` values,
+        without decoding them. Only markers and sizes are read, so
+        nothing is allocated for the values skipped.
+
+        :param count: number of values to skip
+        :raises IndexError: if the data ends part way through a value
+        :raises ValueError: if an unknown marker is encountered
+        """
+        self._offset = _skip_values(self._data, self._offset, count)
+
+    def peek_type(self):
+        """ Return the kind of the next value, without moving past it.
 
-        # Tiny collections
-        if marker == 0x80:
-            return ""
-        elif 0x81 <= marker <= 0x8F:  # TINY_STRING
-            start = self._offset
-            self._offset = start + (marker & 0x0F)
-            return decode(self._data[start:self._offset], "utf-8")
-        elif marker == 0x90:
+        This is one of "null", "boolean", "integer", "float", "bytes",
+        "string", "list", "dictionary" or "structure", as determined by
+        the marker of the value alone.
+
+        :raises IndexError: if there is no more data
+        :raises ValueError: if the next marker is unknown
+        """
+        marker = self._data[self._offset]
+        kind = MARKER_KINDS[marker]
+        if kind is None:
+            raise ValueError("Unknown PackStream marker %02X" % marker)
+        return kind
+
+    # Handlers for each marker family, dispatched by marker byte
+    # through the `_handlers` table defined at the end of the class.
+
+    def _unpack_null(self, marker):
+        return None
+
+    def _unpack_false(self, marker):
+        return False
+
+    def _unpack_true(self, marker):
+        return True
+
+    def _unpack_tiny_int(self, marker):
+        return marker
+
+    def _unpack_tiny_negative_int(self, marker):
+        return marker - 0x100
+
+    def _unpack_int_8(self, marker):
+        return self._read_i8()
+
+    def _unpack_int_16(self, marker):
+        return self._read_i16be()
+
+    def _unpack_int_32(self, marker):
+        return self._read_i32be()
+
+    def _unpack_int_64(self, marker):
+        return self._read_i64be()
+
+    def _unpack_float(self, marker):
+        return self._read_f64be()
+
+    def _unpack_bytes_8(self, marker):
+        return self._read_bytes(self._read_u8())
+
+    def _unpack_bytes_16(self, marker):
+        return self._read_bytes(self._read_u16be())
+
+    def _unpack_bytes_32(self, marker):
+        return self._read_bytes(self._read_u32be())
+
+    def _unpack_empty_string(self, marker):
+        return ""
+
+    def _unpack_tiny_string(self, marker):
+        return self._decode_utf8(self._read(marker & 0x0F))
+
+    def _unpack_string_8(self, marker):
+        return self._decode_utf8(self._read(self._read_u8()))
+
+    def _unpack_tiny_cached_string(self, marker):
+        return self._string_cache.decode(bytes(self._read(marker & 0x0F)))
+
+    def _unpack_cached_string_8(self, marker):
+        return self._string_cache.decode(bytes(self._read(self._read_u8())))
+
+    def _unpack_string_16(self, marker):
+        return self._decode_utf8(self._read(self._read_u16be()))
+
+    def _unpack_string_32(self, marker):
+        return self._decode_utf8(self._read(self._read_u32be()))
+
+    def _unpack_empty_list(self, marker):
+        return []
+
+    def _unpack_tiny_list(self, marker):
+        unpack = self.unpack
+        return [unpack() for _ in range(marker & 0x0F)]
+
+    def _unpack_list_8(self, marker):
+        unpack = self.unpack
+        return [unpack() for _ in range(self._read_u8())]
+
+    def _unpack_list_16(self, marker):
+        unpack = self.unpack
+        return [unpack() for _ in range(self._read_u16be())]
+
+    def _unpack_list_32(self, marker):
+        unpack = self.unpack
+        return [unpack() for _ in range(self._read_u32be())]
+
+    def _unpack_tiny_typed_list(self, marker):
+        return self._unpack_typed_list_items(marker & 0x0F)
+
+    def _unpack_typed_list_8(self, marker):
+        return self._unpack_typed_list_items(self._read_u8())
+
+    def _unpack_typed_list_16(self, marker):
+        return self._unpack_typed_list_items(self._read_u16be())
+
+    def _unpack_typed_list_32(self, marker):
+        return self._unpack_typed_list_items(self._read_u32be())
+
+    def _unpack_typed_list_items(self, size):
+        if size == 0:
+            # Sized lists can be empty too, and stay lists like tiny ones
             return []
-        elif marker == 0x91:
-            return [self.unpack()]
-        elif marker == 0x92:
-            return [self.unpack(), self.unpack()]
-        elif marker == 0x93:
-            return [self.unpack(), self.unpack(), self.unpack()]
-        elif 0x94 <= marker <= 0x9F:    # TINY_LIST
-            return [self.unpack() for _ in range(marker & 0x0F)]
-        elif 0xA0 <= marker <= 0xAF:    # TINY_DICT
-            size = marker & 0x0F
-            value = {}
-            for _ in range(size):
-                key = self.unpack()
-                value[key] = self.unpack()
-            return value
+        values = self._read_array(size)
+        if values is None:
+            unpack = self.unpack
+            values = _typed_list([unpack() for _ in range(size)])
+        return values
 
-        # Integer
-        elif 0x00 <= marker <= 0x7F:
-            return marker
-        elif 0xF0 <= marker <= 0xFF:
-            return marker - 0x100
-        elif marker == 0xC8:
-            return self._read_i8()
-        elif marker == 0xC9:
-            return self._read_i16be()
-        elif marker == 0xCA:
-            return self._read_i32be()
-        elif marker == 0xCB:
-            return self._read_i64be()
-
-        # String
-        elif marker == 0xD0:  # STRING_8:
-            size = self._read_u8()
-            return decode(self._read(size), "utf-8")
-        elif marker == 0xD1:  # STRING_16:
-            size = self._read_u16be()
-            return decode(self._read(size), "utf-8")
-        elif marker == 0xD2:  # STRING_32:
-            size = self._read_u32be()
-            return decode(self._read(size), "utf-8")
-
-        # Structure
-        elif 0xB0 <= marker <= 0xBF:    # TINY_STRUCT
-            tag = self._read_u8()
-            fields = [self.unpack() for _ in range(marker & 0x0F)]
-            if tag == 68:  # 'D'
-                return self._hydrate_date(*fields)
-            elif tag in (84, 116):  # 'T' and 't'
-                return self._hydrate_time(*fields)
-            elif tag in (70, 100, 102):  # b"F", b"f", b"d"
-                return self._hydrate_datetime(*fields)
-            elif tag == 69:  # b"E"
-                return self._hydrate_duration(*fields)
-            elif tag in (88, 89):  # b"X", b"Y"
-                return self._hydrate_point(*fields)
-            else:
-                return Structure(tag, *fields)
+    def _unpack_tiny_lazy_list(self, marker):
+        return self._unpack_lazy_list_items(marker & 0x0F)
 
-        # Float
-        elif marker == 0xC1:
-            return self._read_f64be()
+    def _unpack_lazy_list_8(self, marker):
+        return self._unpack_lazy_list_items(self._read_u8())
 
-        # Boolean
-        elif marker == 0xC2:
-            return False
-        elif marker == 0xC3:
-            return True
+    def _unpack_lazy_list_16(self, marker):
+        return self._unpack_lazy_list_items(self._read_u16be())
 
-        # Null
-        elif marker == 0xC0:
-            return None
+    def _unpack_lazy_list_32(self, marker):
+        return self._unpack_lazy_list_items(self._read_u32be())
 
-        # Bytes
-        elif marker == 0xCC:
-            size = self._read_u8()
-            return bytes(self._read(size))
-        elif marker == 0xCD:
-            size = self._read_u16be()
-            return bytes(self._read(size))
-        elif marker == 0xCE:
-            size = self._read_u32be()
-            return bytes(self._read(size))
-
-        # List
-        elif marker == 0xD4:  # LIST_8:
-            size = self._read_u8()
-            return [self.unpack() for _ in range(size)]
-        elif marker == 0xD5:  # LIST_16:
-            size = self._read_u16be()
-            return [self.unpack() for _ in range(size)]
-        elif marker == 0xD6:  # LIST_32:
-            size = self._read_u32be()
-            return [self.unpack() for _ in range(size)]
-
-        # Dictionary
-        elif marker == 0xD8:  # MAP_8:
-            size = self._read_u8()
-            value = {}
-            for _ in range(size):
-                key = self.unpack()
-                value[key] = self.unpack()
-            return value
-        elif marker == 0xD9:  # MAP_16:
-            size = self._read_u16be()
-            value = {}
-            for _ in range(size):
-                key = self.unpack()
-                value[key] = self.unpack()
-            return value
-        elif marker == 0xDA:  # MAP_32:
-            size = self._read_u32be()
-            value = {}
-            for _ in range(size):
-                key = self.unpack()
-                value[key] = self.unpack()
-            return value
+    def _unpack_lazy_list_items(self, size):
+        start = self._offset
+        if size >= BULK_THRESHOLD and start < len(self._data):
+            end = _skip_uniform_items(self._data, start, size)
+            if end is not None and end <= len(self._data):
+                # Items all of one size can be located by arithmetic
+                self._offset = end
+                return LazyList(self._lazy_unpacker(), range(start, end + 1, (end - start) // size))
+        return LazyList(self._lazy_unpacker(), self._value_offsets(size))
 
-        else:
-            raise ValueError("Unknown PackStream marker %02X" % marker)
+    def _unpack_tiny_lazy_dict(self, marker):
+        return self._unpack_lazy_dict_items(marker & 0x0F)
 
-    def _hydrate_date(self, days):
-        """ Hydrator for `Date` values.
+    def _unpack_lazy_dict_8(self, marker):
+        return self._unpack_lazy_dict_items(self._read_u8())
 
-        :param days:
-        :return: Date
-        """
-        return Date.from_ordinal(UNIX_EPOCH_DATE_ORDINAL + days)
+    def _unpack_lazy_dict_16(self, marker):
+        return self._unpack_lazy_dict_items(self._read_u16be())
+
+    def _unpack_lazy_dict_32(self, marker):
+        return self._unpack_lazy_dict_items(self._read_u32be())
 
-    def _hydrate_time(self, nanoseconds, tz=None):
-        """ Hydrator for `Time` and `LocalTime` values.
+    def _unpack_lazy_dict_items(self, size):
+        return LazyMap(self._lazy_unpacker(), self._value_offsets(2 * size))
 
-        :param nanoseconds:
-        :param tz:
-        :return: Time
+    def _value_offsets(self, count):
+        """ Move past `count` values without decoding them, returning
+        the offsets at which each starts, followed by the offset at
+        which the last one ends.
         """
-        seconds, nanoseconds = map(int, divmod(nanoseconds, 1000000000))
-        minutes, seconds = map(int, divmod(seconds, 60))
-        hours, minutes = map(int, divmod(minutes, 60))
-        seconds = (1000000000 * seconds + nanoseconds) / 1000000000
-        t = Time(hours, minutes, seconds)
-        if tz is None:
-            return t
-        tz_offset_minutes, tz_offset_seconds = divmod(tz, 60)
-        zone = FixedOffset(tz_offset_minutes)
-        return zone.localize(t)
-
-    def _hydrate_datetime(self, seconds, nanoseconds, tz=None):
-        """ Hydrator for `DateTime` and `LocalDateTime` values.
-
-        :param seconds:
-        :param nanoseconds:
-        :param tz:
-        :return: datetime
-        """
-        minutes, seconds = map(int, divmod(seconds, 60))
-        hours, minutes = map(int, divmod(minutes, 60))
-        days, hours = map(int, divmod(hours, 24))
-        seconds = (1000000000 * seconds + nanoseconds) / 1000000000
-        t = DateTime.combine(Date.from_ordinal(UNIX_EPOCH_DATE_ORDINAL + days),
-                             Time(hours, minutes, seconds))
-        if tz is None:
-            return t
-        if isinstance(tz, int):
-            tz_offset_minutes, tz_offset_seconds = divmod(tz, 60)
-            zone = FixedOffset(tz_offset_minutes)
-        else:
-            zone = timezone(tz)
-        return zone.localize(t)
+        data = self._data
+        offset = self._offset
+        offsets = [offset]
+        for _ in range(count):
+            offset = _skip_values(data, offset, 1)
+            offsets.append(offset)
+        self._offset = offset
+        return offsets
+
+    def _lazy_unpacker(self):
+        # Items of lazy values are decoded by a copy of this unpacker,
+        # so that accessing them does not disturb the position of this
+        # one; that copy then decodes nested lazy values itself
+        unpacker = self._proxy_unpacker
+        if unpacker is None:
+            unpacker = self._proxy_unpacker = copy(self)
+            unpacker._proxy_unpacker = unpacker
+        return unpacker
+
+    def select(self, paths):
+        """ Read the next value, decoding only the parts of it found at
+        the given paths, and skipping over everything else.
+
+        Each path is a sequence of dictionary keys, separated by dots,
+        and list indexes, in square brackets, such as ``"name"``,
+        ``"address.city"`` or ``"tags[0]"``. Paths that do not lead to a
+        value are left out of the result.
+
+        :param paths: iterable of path strings
+        :return: dictionary mapping each path found to its value
+        """
+        result = {}
+        self._select(_compile_selection(paths), result)
+        return result
 
-    def _hydrate_duration(self, months, days, seconds, nanoseconds):
-        """ Hydrator for `Duration` values.
+    def _select(self, selection, result):
+        """ Decode the parts of the next value selected by a tree of
+        path steps, as built by `_compile_selection`, into `result`.
+        """
+        marker = self._data[self._offset]
+        kind = MARKER_KINDS[marker]
+        if kind == "dictionary":
+            self._offset += 1
+            size = self._read_size(marker)
+            wanted = sum(1 for step in selection if not isinstance(step, int))
+            for i in range(size):
+                entry = selection.get(self.unpack())
+                if entry is None:
+                    self.skip()
+                else:
+                    self._select_entry(entry, result)
+                    wanted -= 1
+                    if not wanted:
+                        self.skip(2 * (size - i - 1))
+                        break
+        elif kind == "list":
+            self._offset += 1
+            size = self._read_size(marker)
+            wanted = sum(1 for step in selection if isinstance(step, int) and step < size)
+            for i in range(size):
+                if not wanted:
+                    self.skip(size - i)
+                    break
+                entry = selection.get(i)
+                if entry is None:
+                    self.skip()
+                else:
+                    self._select_entry(entry, result)
+                    wanted -= 1
+        else:
+            self.skip()
 
-        :param months:
-        :param days:
-        :param seconds:
-        :param nanoseconds:
-        :return: `duration` namedtuple
+    def _select_entry(self, entry, result):
+        path, selection = entry
+        if path is None:
+            self._select(selection, result)
+        else:
+            # Some paths end here, but others may continue further
+            # into the same value, so are looked up in the result
+            value = result[path] = self.unpack()
+            if selection:
+                _select_from(value, selection, result)
+
+    def _read_size(self, marker):
+        """ Read the size of a list or dictionary with a given marker.
         """
-        return Duration(months=months, days=days, seconds=seconds, nanoseconds=nanoseconds)
+        if marker < 0xC0:
+            return marker & 0x0F
+        elif marker in (0xD4, 0xD8):
+            return self._read_u8()
+        elif marker in (0xD5, 0xD9):
+            return self._read_u16be()
+        else:
+            return self._read_u32be()
+
+    def _unpack_at(self, offset):
+        self._offset = offset
+        return self.unpack()
 
-    def _hydrate_point(self, srid, *coordinates):
-        """ Create a new instance of a Point subclass from a raw
-        set of fields. The subclass chosen is determined by the
-        given SRID; a ValueError will be raised if no such
-        subclass can be found.
+    def _read_array(self, size):
+        """ Attempt to read `size` numeric items that all share the
+        same marker straight into an array, returning :const:`None`
+        if the items are not of that form.
         """
+        data = self._data
+        start = self._offset
+        if start >= len(data):
+            return None
+        marker = data[start]
+        if marker < 0x80 or marker >= 0xF0:
+            # TINY_INT items are a single two's complement byte each
+            stride, width, typecode = 1, 1, "q"
+            end = start + size
+            payload = start
+            if end > len(data) or bytes(data[start:end]).translate(None, TINY_INT_MARKERS):
+                return None
+        else:
+            try:
+                stride, typecode = FIXED_WIDTH_NUMERIC_MARKERS[marker]
+            except KeyError:
+                return None
+            width = stride - 1
+            end = start + stride * size
+            payload = start + 1
+            if end > len(data) or data[start:end:stride] != bytes(bytearray([marker])) * size:
+                return None
+        # Gather the big-endian payload bytes from between the markers
+        # into 8-byte slots, sign-extending integers narrower than that
+        raw = bytearray(8 * size)
+        pad = 8 - width
+        if pad:
+            signs = bytes(data[payload:end:stride]).translate(SIGN_EXTENSION)
+            for i in range(pad):
+                raw[i::8] = signs
+        for i in range(width):
+            raw[pad + i::8] = data[payload + i:end:stride]
+        values = array(typecode)
+        values.frombytes(raw)
+        if byteorder == "little":
+            values.byteswap()
+        self._offset = end
+        return values
+
+    def _unpack_tiny_dict(self, marker):
+        return self._unpack_dict_items(marker & 0x0F)
+
+    def _unpack_dict_8(self, marker):
+        return self._unpack_dict_items(self._read_u8())
+
+    def _unpack_dict_16(self, marker):
+        return self._unpack_dict_items(self._read_u16be())
+
+    def _unpack_dict_32(self, marker):
+        return self._unpack_dict_items(self._read_u32be())
+
+    def _unpack_dict_items(self, size):
+        unpack = self.unpack
+        value = {}
+        for _ in range(size):
+            key = unpack()
+            value[key] = unpack()
+        return value
+
+    def _unpack_tiny_cached_key_dict(self, marker):
+        return self._unpack_cached_key_dict_items(marker & 0x0F)
+
+    def _unpack_cached_key_dict_8(self, marker):
+        return self._unpack_cached_key_dict_items(self._read_u8())
+
+    def _unpack_cached_key_dict_16(self, marker):
+        return self._unpack_cached_key_dict_items(self._read_u16be())
+
+    def _unpack_cached_key_dict_32(self, marker):
+        return self._unpack_cached_key_dict_items(self._read_u32be())
+
+    def _unpack_cached_key_dict_items(self, size):
+        unpack = self.unpack
+        decode_key = self._key_cache.decode
+        data = self._data
+        value = {}
+        # Cache entries are keyed by bytes, so other buffers need their
+        # slices copying
+        copy_slices = type(data) is not bytes
+        for _ in range(size):
+            offset = self._offset
+            marker = data[offset]
+            if 0x80 <= marker < 0x90:
+                start = offset + 1
+                end = start + (marker & 0x0F)
+            elif marker == 0xD0:
+                start = offset + 2
+                end = start + data[offset + 1]
+            else:
+                key = unpack()
+                value[key] = unpack()
+                continue
+            if end > len(data):
+                raise IndexError("Not enough data to read %d bytes" % (end - start))
+            self._offset = end
+            if copy_slices:
+                key = decode_key(bytes(data[start:end]))
+            else:
+                key = decode_key(data[start:end])
+            value[key] = unpack()
+        return value
+
+    def _unpack_tiny_struct(self, marker):
+        tag = self._read_u8()
+        unpack = self.unpack
+        fields = [unpack() for _ in range(marker & 0x0F)]
         try:
-            point_class, dim = Point.class_for_srid(srid)
+            hydrator = self._hydrators[tag]
         except KeyError:
-            point = Point(coordinates)
-            point.srid = srid
-            return point
+            return Structure(tag, *fields)
         else:
-            if len(coordinates) != dim:
-                raise ValueError("SRID %d requires %d coordinates (%d provided)" % (srid, dim, len(coordinates)))
-            return point_class(coordinates)
+            return hydrator(*fields)
+
+    def _unpack_unknown(self, marker):
+        raise ValueError("Unknown PackStream marker %02X" % marker)
 
     def _read(self, n=1):
         q = self._offset + n
+        if q > len(self._data):
+            raise IndexError("Not enough data to read %d bytes" % n)
         m = self._data[self._offset:q]
         self._offset = q
         return m
 
+    def _read_bytes(self, n):
+        m = self._read(n)
+        if self._zero_copy:
+            return m
+        else:
+            return bytes(m)
+
     def _read_u8(self):
-        q = self._offset + 1
-        n, = struct_unpack(">B", self._data[self._offset:q])
-        self._offset = q
+        n = self._data[self._offset]
+        self._offset += 1
         return n
 
     def _read_u16be(self):
-        q = self._offset + 2
-        n, = struct_unpack(">H", self._data[self._offset:q])
-        self._offset = q
+        n, = UINT_16.unpack_from(self._data, self._offset)
+        self._offset += 2
         return n
 
     def _read_u32be(self):
-        q = self._offset + 4
-        n, = struct_unpack(">I", self._data[self._offset:q])
-        self._offset = q
+        n, = UINT_32.unpack_from(self._data, self._offset)
+        self._offset += 4
         return n
 
     def _read_i8(self):
-        q = self._offset + 1
-        z, = struct_unpack(">b", self._data[self._offset:q])
-        self._offset = q
+        z, = INT_8.unpack_from(self._data, self._offset)
+        self._offset += 1
         return z
 
     def _read_i16be(self):
-        q = self._offset + 2
-        z, = struct_unpack(">h", self._data[self._offset:q])
-        self._offset = q
+        z, = INT_16.unpack_from(self._data, self._offset)
+        self._offset += 2
         return z
 
     def _read_i32be(self):
-        q = self._offset + 4
-        z, = struct_unpack(">i", self._data[self._offset:q])
-        self._offset = q
+        z, = INT_32.unpack_from(self._data, self._offset)
+        self._offset += 4
         return z
 
     def _read_i64be(self):
-        q = self._offset + 8
-        z, = struct_unpack(">q", self._data[self._offset:q])
-        self._offset = q
+        z, = INT_64.unpack_from(self._data, self._offset)
+        self._offset += 8
         return z
 
     def _read_f64be(self):
-        q = self._offset + 8
-        r, = struct_unpack(">d", self._data[self._offset:q])
-        self._offset = q
+        r, = FLOAT_64.unpack_from(self._data, self._offset)
+        self._offset += 8
         return r
 
+    # Marker byte -> handler function
+    _handlers = [_unpack_unknown] * 0x100
+    _handlers[0x00:0x80] = [_unpack_tiny_int] * 0x80
+    _handlers[0x80] = _unpack_empty_string
+    _handlers[0x81:0x90] = [_unpack_tiny_string] * 0x0F
+    _handlers[0x90] = _unpack_empty_list
+    _handlers[0x91:0xA0] = [_unpack_tiny_list] * 0x0F
+    _handlers[0xA0:0xB0] = [_unpack_tiny_dict] * 0x10
+    _handlers[0xB0:0xC0] = [_unpack_tiny_struct] * 0x10
+    _handlers[0xC0] = _unpack_null
+    _handlers[0xC1] = _unpack_float
+    _handlers[0xC2] = _unpack_false
+    _handlers[0xC3] = _unpack_true
+    _handlers[0xC8] = _unpack_int_8
+    _handlers[0xC9] = _unpack_int_16
+    _handlers[0xCA] = _unpack_int_32
+    _handlers[0xCB] = _unpack_int_64
+    _handlers[0xCC] = _unpack_bytes_8
+    _handlers[0xCD] = _unpack_bytes_16
+    _handlers[0xCE] = _unpack_bytes_32
+    _handlers[0xD0] = _unpack_string_8
+    _handlers[0xD1] = _unpack_string_16
+    _handlers[0xD2] = _unpack_string_32
+    _handlers[0xD4] = _unpack_list_8
+    _handlers[0xD5] = _unpack_list_16
+    _handlers[0xD6] = _unpack_list_32
+    _handlers[0xD8] = _unpack_dict_8
+    _handlers[0xD9] = _unpack_dict_16
+    _handlers[0xDA] = _unpack_dict_32
+    _handlers[0xF0:0x100] = [_unpack_tiny_negative_int] * 0x10
+
+    # As above, but with arrays for homogeneous numeric lists
+    _typed_handlers = list(_handlers)
+    _typed_handlers[0x91:0xA0] = [_unpack_tiny_typed_list] * 0x0F
+    _typed_handlers[0xD4] = _unpack_typed_list_8
+    _typed_handlers[0xD5] = _unpack_typed_list_16
+    _typed_handlers[0xD6] = _unpack_typed_list_32
+
+    # As above, but with proxies for lists and dictionaries
+    _lazy_handlers = list(_handlers)
+    _lazy_handlers[0x90:0xA0] = [_unpack_tiny_lazy_list] * 0x10
+    _lazy_handlers[0xA0:0xB0] = [_unpack_tiny_lazy_dict] * 0x10
+    _lazy_handlers[0xD4] = _unpack_lazy_list_8
+    _lazy_handlers[0xD5] = _unpack_lazy_list_16
+    _lazy_handlers[0xD6] = _unpack_lazy_list_32
+    _lazy_handlers[0xD8] = _unpack_lazy_dict_8
+    _lazy_handlers[0xD9] = _unpack_lazy_dict_16
+    _lazy_handlers[0xDA] = _unpack_lazy_dict_32
+
+
+class LazyList(Sequence):
+    """ Read-only sequence over the items of an encoded list, as
+    returned by an :class:`.Unpacker` in lazy mode. Each item is
+    decoded when first accessed, and kept for subsequent access.
+    """
+
+    def __init__(self, unpacker, offsets):
+        self._unpacker = unpacker
+        self._offsets = offsets
+        self._values = {}
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, list(self))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("list index out of range")
+        try:
+            return self._values[index]
+        except KeyError:
+            value = self._values[index] = self._unpacker._unpack_at(self._offsets[index])
+            return value
+
+
+class LazyMap(Mapping):
+    """ Read-only mapping over the entries of an encoded dictionary, as
+    returned by an :class:`.Unpacker` in lazy mode. Keys are decoded
+    only as far as needed to find the one looked up, and each value is
+    decoded when first accessed, then kept for subsequent access.
+    """
+
+    def __init__(self, unpacker, offsets):
+        self._unpacker = unpacker
+        self._offsets = offsets
+        self._values = {}
+        # Keys decoded so far, and the offsets of their values. Keys
+        # are decoded from the last entry backwards so that, where a
+        # key is repeated, its last value wins, as when decoding eagerly
+        self._keys = []
+        self._index = {}
+        # All keys in order of first occurrence, once decoded
+        self._order = None
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, dict(self))
+
+    def __len__(self):
+        return len(self._key_order())
+
+    def __iter__(self):
+        return iter(self._key_order())
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            offset = self._index.get(key)
+            if offset is None:
+                offset = self._find(key)
+                if offset is None:
+                    raise KeyError(key)
+            value = self._values[key] = self._unpacker._unpack_at(offset)
+            return value
+
+    def _key_order(self):
+        if self._order is None:
+            self._find(None)
+            self._order = list(dict.fromkeys(reversed(self._keys)))
+        return self._order
+
+    def _find(self, key):
+        """ Decode keys until `key` is found, returning the offset of
+        its value, or until all keys are decoded, returning None.
+        """
+        unpack_at = self._unpacker._unpack_at
+        offsets = self._offsets
+        keys = self._keys
+        index = self._index
+        size = (len(offsets) - 1) // 2
+        while len(keys) < size:
+            i = 2 * (size - 1 - len(keys))
+            k = unpack_at(offsets[i])
+            keys.append(k)
+            if k not in index:
+                index[k] = offsets[i + 1]
+                if k == key:
+                    return offsets[i + 1]
+        return None
+
+
+# A single step of a selection path: a dictionary key, preceded by a
+# dot unless it comes first, or a list index in square brackets
+PATH_STEP = re_compile(r"(\.?)([^.\[\]]+)|\[(\d+)\]")
+
+
+def _parse_path(path):
+    """ Split a selection path into a tuple of dictionary keys and list
+    indexes.
+    """
+    steps = []
+    position = 0
+    while position < len(path):
+        match = PATH_STEP.match(path, position)
+        if match is None:
+            raise ValueError("Invalid path %r" % path)
+        dot, key, index = match.groups()
+        if key is not None and dot != ("." if steps else ""):
+            raise ValueError("Invalid path %r" % path)
+        steps.append(key if index is None else int(index))
+        position = match.end()
+    if not steps:
+        raise ValueError("Invalid path %r" % path)
+    return tuple(steps)
+
+
+def _compile_selection(paths):
+    """ Build a tree of path steps from a collection of selection
+    paths. Each node maps a step to a pair of the path that ends with
+    that step (or None) and the node for the steps that follow it.
+    """
+    root = {}
+    for path in paths:
+        *steps, last = _parse_path(path)
+        node = root
+        for step in steps:
+            node = node.setdefault(step, [None, {}])[1]
+        node.setdefault(last, [None, {}])[0] = path
+    return root
+
+
+def _select_from(value, selection, result):
+    """ As for `Unpacker._select`, but for a value already decoded.
+    """
+    for step, (path, subselection) in selection.items():
+        if isinstance(step, int):
+            if not isinstance(value, (list, LazyList)) or step >= len(value):
+                continue
+        elif not isinstance(value, Mapping) or step not in value:
+            continue
+        item = value[step]
+        if path is not None:
+            result[path] = item
+        if subselection:
+            _select_from(item, subselection, result)
+
+
+class _SourceReader(object):
+    """ Reader that appends data from a byte source, such as a file or
+    a socket, onto the end of a bytearray. The source is read via
+    `recv_into`, `readinto` or `read`, whichever is available first.
+    """
+
+    def __init__(self, source):
+        if hasattr(source, "recv_into"):
+            self._read_into = source.recv_into
+        elif hasattr(source, "readinto"):
+            self._read_into = source.readinto
+        else:
+            self._read_into = None
+            self._read = source.read
+        self._scratch = bytearray()
+
+    def read_onto(self, buffer, size):
+        """ Read up to `size` bytes from the source onto the end of
+        `buffer`. Returns the number of bytes read, zero indicating end
+        of stream.
+        """
+        if self._read_into is None:
+            data = self._read(size)
+            buffer += data
+            return len(data)
+        scratch = self._scratch
+        if len(scratch) < size:
+            scratch = self._scratch = bytearray(size)
+        with memoryview(scratch) as view:
+            with view[:size] as target:
+                n = self._read_into(target) or 0
+            buffer += scratch[:n]
+        return n
+
+
+class StreamUnpacker(object):
+    """ Incremental unpacker that pulls PackStream data from a byte
+    source, such as a file or a socket, and yields each value as soon
+    as all of its bytes have arrived.
+
+    The source is read via `recv_into`, `readinto` or `read`, whichever
+    is available first. Bytes are held in an internal buffer only until
+    the value they belong to has been decoded, so the buffer only ever
+    needs to be large enough for a single value. If `max_buffer_size`
+    is given, a value that would need a larger buffer raises a
+    ValueError instead of being read.
+
+    :param source: object with a `recv_into`, `readinto` or `read` method
+    :param read_size: minimum number of bytes to request per read
+    :param max_buffer_size: upper limit on the size of the internal
+        buffer, or :const:`None` for no limit
+    """
+
+    def __init__(self, source, read_size=8192, max_buffer_size=None):
+        if max_buffer_size is not None and max_buffer_size < 1:
+            raise ValueError("Maximum buffer size must be positive")
+        self._buffer = bytearray()
+        self._unpacker = Unpacker(self._buffer)
+        self._read_size = read_size
+        self._max_buffer_size = max_buffer_size
+        self._reader = _SourceReader(source)
+        # Progress of the scan through the value at the front of the
+        # buffer: offset of the next marker, and number of values
+        # still to be stepped over
+        self._scan_offset = 0
+        self._scan_count = 1
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.unpack()
+            except EOFError:
+                break
+
+    def unpack(self):
+        """ Read and return the next value from the source.
+
+        :raises EOFError: if the source is exhausted before another
+            value begins
+        :raises ValueError: if the source is exhausted part way
+            through a value
+        """
+        unpacker = self._unpacker
+        while not self._scan():
+            if not self._fill():
+                if unpacker._offset < len(self._buffer):
+                    raise ValueError("Incomplete PackStream value at end of stream")
+                raise EOFError("End of stream")
+        value = unpacker.unpack()
+        self._scan_offset = unpacker._offset
+        self._scan_count = 1
+        return value
+
+    def _scan(self):
+        """ Step through the markers and sizes of the value at the front
+        of the buffer, picking up where the last scan stopped, as far
+        as the buffered data allows. Returns true once all bytes of
+        the value have arrived. Each byte is therefore scanned only
+        once, however many reads a value takes to arrive.
+        """
+        data = self._buffer
+        offset = self._scan_offset
+        count = self._scan_count
+        end = len(data)
+        while count and offset < end:
+            marker = data[offset]
+            layout = SKIP_LAYOUTS[marker]
+            if layout is not None:
+                size, n = layout
+                offset += 1 + size
+                count += n - 1
+            elif marker in SIZED_VALUE_LAYOUTS:
+                width, multiple, is_bytes = SIZED_VALUE_LAYOUTS[marker]
+                if offset + 1 + width > end:
+                    break
+                size = multiple * int.from_bytes(data[offset + 1:offset + 1 + width], "big")
+                offset += 1 + width
+                if is_bytes:
+                    offset += size
+                    count -= 1
+                else:
+                    count += size - 1
+            else:
+                raise ValueError("Unknown PackStream marker %02X" % marker)
+        self._scan_offset = offset
+        self._scan_count = count
+        return not count and offset <= end
+
+    def _fill(self):
+        """ Discard consumed bytes from the buffer, then read more data
+        from the source onto the end of it. Returns the number of bytes
+        read, zero indicating end of stream.
+        """
+        buffer = self._buffer
+        start = self._unpacker._offset
+        if start:
+            del buffer[:start]
+            self._unpacker._offset = 0
+            self._scan_offset -= start
+        pending = len(buffer)
+        # Ask for at least as much again as the partial value already
+        # held, so that sources which can return more data per read
+        # deliver a large value in fewer reads
+        size = max(self._read_size, pending)
+        if self._max_buffer_size is not None:
+            size = min(size, self._max_buffer_size - pending)
+            if size <= 0:
+                raise ValueError("PackStream value exceeds maximum buffer "
+                                 "size of %d bytes" % self._max_buffer_size)
+        return self._reader.read_onto(buffer, size)
+
+
+# Largest chunk size that fits into a chunk header
+MAX_CHUNK_SIZE = 0xFFFF
+
+
+class ChunkedWriter(object):
+    """ Writer for PackStream messages framed in chunks, as used by
+    Bolt. Each message is split into chunks of at most `max_chunk_size`
+    bytes, each preceded by its size as a 16-bit unsigned integer, and
+    is terminated by a chunk of size zero.
+
+    Messages are packed into a buffer that is reused from one message
+    to the next, with room left at the start for the header of the
+    first chunk. A message that fits into a single chunk is therefore
+    sent in a single write, straight from that buffer.
+
+    :param sink: object with a `sendall` or `write` method
+    :param max_chunk_size: maximum number of bytes in each chunk
+    :param version: Bolt protocol version, as for :class:`.Packer`
+    :param dehydrators: dictionary mapping types to dehydrator
+        functions, as for :class:`.Packer`
+    """
+
+    def __init__(self, sink, max_chunk_size=MAX_CHUNK_SIZE, version=(), dehydrators=None):
+        if not 0 < max_chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError("Maximum chunk size must be between 1 and %d" % MAX_CHUNK_SIZE)
+        self._max_chunk_size = max_chunk_size
+        self._buffer = BytesIO()
+        self._packer = Packer(self._buffer, version, dehydrators)
+        if hasattr(sink, "sendall"):
+            self._send = sink.sendall
+        else:
+            self._send = sink.write
+
+    def write(self, value):
+        """ Pack a value and write it out as a single message.
+
+        :param value: value to pack, typically a :class:`.Structure`
+        """
+        buffer = self._buffer
+        buffer.seek(0)
+        buffer.write(b"\x00\x00")
+        self._packer.pack(value)
+        size = buffer.tell() - 2
+        buffer.write(b"\x00\x00")
+        max_chunk_size = self._max_chunk_size
+        with buffer.getbuffer() as data:
+            if size <= max_chunk_size:
+                UINT_16.pack_into(data, 0, size)
+                with data[:size + 4] as message:
+                    self._send(message)
+            else:
+                end = size + 2
+                for start in range(2, end, max_chunk_size):
+                    stop = min(start + max_chunk_size, end)
+                    self._send(UINT_16.pack(stop - start))
+                    with data[start:stop] as chunk:
+                        self._send(chunk)
+                self._send(b"\x00\x00")
+
+
+class ChunkedReader(object):
+    """ Reader for PackStream messages framed in chunks, as written by
+    :class:`.ChunkedWriter`, from a byte source such as a file or a
+    socket.
+
+    Data is read from the source into a single buffer. The chunks of a
+    message that spans several are moved together within that buffer,
+    rather than joined into a new object, and each message is decoded
+    where it lies. Empty messages, used in Bolt as no-ops to keep a
+    connection alive, are skipped.
+
+    :param source: object with a `recv_into`, `readinto` or `read` method
+    :param max_chunk_size: maximum number of bytes accepted in a
+        single chunk
+    :param read_size: minimum number of bytes to request per read
+    :param hydrators: dictionary mapping structure tags to hydrator
+        functions, as for :class:`.Unpacker`
+    """
+
+    def __init__(self, source, max_chunk_size=MAX_CHUNK_SIZE, read_size=8192, hydrators=None):
+        if not 0 < max_chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError("Maximum chunk size must be between 1 and %d" % MAX_CHUNK_SIZE)
+        self._max_chunk_size = max_chunk_size
+        self._read_size = read_size
+        self._buffer = bytearray()
+        self._unpacker = Unpacker(self._buffer, hydrators=hydrators)
+        self._reader = _SourceReader(source)
+        self._offset = 0
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.read()
+            except EOFError:
+                break
+
+    def read(self):
+        """ Read and return the value held in the next message from
+        the source.
+
+        :raises EOFError: if the source is exhausted before another
+            message begins
+        :raises ValueError: if the source is exhausted part way
+            through a message, if a chunk exceeds the maximum chunk
+            size, or if a message does not hold exactly one value
+        """
+        buffer = self._buffer
+        # Start and end of the message data gathered so far, and the
+        # position of the next chunk header
+        start = end = position = self._offset
+        while True:
+            available = len(buffer) - position
+            if available >= 2:
+                size = buffer[position] << 8 | buffer[position + 1]
+                if size == 0:
+                    position += 2
+                    if end > start:
+                        self._offset = position
+                        return self._decode(start, end)
+                    # Empty message
+                    start = end = position
+                    continue
+                elif size > self._max_chunk_size:
+                    raise ValueError("Chunk of %d bytes exceeds maximum chunk "
+                                     "size of %d bytes" % (size, self._max_chunk_size))
+                elif available >= 2 + size:
+                    if end < position + 2:
+                        # Move the chunk data up against that of the
+                        # previous chunk
+                        with memoryview(buffer) as view:
+                            view[end:end + size] = view[position + 2:position + 2 + size]
+                    end += size
+                    position += 2 + size
+                    continue
+                needed = 2 + size - available
+            else:
+                needed = 2 - available
+            # Discard data from previous messages, then read more
+            if start:
+                del buffer[:start]
+                end -= start
+                position -= start
+                start = 0
+            if not self._reader.read_onto(buffer, max(self._read_size, needed)):
+                self._offset = 0
+                if buffer:
+                    raise ValueError("Incomplete message at end of stream")
+                raise EOFError("End of stream")
+
+    def _decode(self, start, end):
+        unpacker = self._unpacker
+        unpacker._offset = start
+        try:
+            value = unpacker.unpack()
+        except (IndexError, struct_error):
+            raise ValueError("Incomplete PackStream value in message")
+        if unpacker._offset != end:
+            raise ValueError("Message does not hold exactly one PackStream value")
+        return value
+
+
+# Markers of values with a payload of fixed size, mapped to that size
+FIXED_PAYLOAD_SIZES = {0xC1: 8, 0xC8: 1, 0xC9: 2, 0xCA: 4, 0xCB: 8}
+
+# Markers of values with a size field, mapped to the width of that
+# field, the number of bytes (for byte arrays and strings) or values
+# (for lists and dictionaries) that make up each unit of size, and
+# whether those units are bytes
+SIZED_VALUE_LAYOUTS = {
+    0xCC: (1, 1, True), 0xCD: (2, 1, True), 0xCE: (4, 1, True),
+    0xD0: (1, 1, True), 0xD1: (2, 1, True), 0xD2: (4, 1, True),
+    0xD4: (1, 1, False), 0xD5: (2, 1, False), 0xD6: (4, 1, False),
+    0xD8: (1, 2, False), 0xD9: (2, 2, False), 0xDA: (4, 2, False),
+}
+
+
+def _skip_layout(marker):
+    if marker < 0x80 or marker >= 0xF0 or marker in (0xC0, 0xC2, 0xC3):
+        return 0, 0                                   # null, boolean, tiny integer
+    elif marker < 0x90:
+        return marker - 0x80, 0                       # tiny string
+    elif marker < 0xA0:
+        return 0, marker - 0x90                       # tiny list
+    elif marker < 0xB0:
+        return 0, 2 * (marker - 0xA0)                 # tiny dictionary
+    elif marker < 0xC0:
+        return 1, marker - 0xB0                       # tiny structure
+    elif marker in FIXED_PAYLOAD_SIZES:
+        return FIXED_PAYLOAD_SIZES[marker], 0
+    else:
+        return None
+
+
+# Markers of values without a size field, mapped to the number of
+# bytes that follow the marker and the number of values nested within
+SKIP_LAYOUTS = [_skip_layout(marker) for marker in range(0x100)]
+
+# Markers of values that consist of the marker alone
+SINGLE_BYTE_VALUE_MARKERS = bytes(bytearray(marker for marker in range(0x100)
+                                            if SKIP_LAYOUTS[marker] == (0, 0)))
+
+
+def _marker_kind(marker):
+    if marker < 0x80 or marker >= 0xF0 or 0xC8 <= marker <= 0xCB:
+        return "integer"
+    elif marker < 0x90 or 0xD0 <= marker <= 0xD2:
+        return "string"
+    elif marker < 0xA0 or 0xD4 <= marker <= 0xD6:
+        return "list"
+    elif marker < 0xB0 or 0xD8 <= marker <= 0xDA:
+        return "dictionary"
+    elif marker < 0xC0:
+        return "structure"
+    elif marker == 0xC0:
+        return "null"
+    elif marker == 0xC1:
+        return "float"
+    elif marker in (0xC2, 0xC3):
+        return "boolean"
+    elif 0xCC <= marker <= 0xCE:
+        return "bytes"
+    else:
+        return None
+
+
+# Kind of value introduced by each marker, as reported by
+# `Unpacker.peek_type`, or None for unknown markers
+MARKER_KINDS = [_marker_kind(marker) for marker in range(0x100)]
+
+
+def _skip_values(data, offset, count):
+    """ Return the offset just past `count` consecutive values encoded
+    in `data` from `offset`, found by following markers and sizes only,
+    without decoding anything.
+
+    :raises IndexError: if the data ends part way through a value
+    :raises ValueError: if an unknown marker is encountered
+    """
+    while count:
+        count -= 1
+        marker = data[offset]
+        offset += 1
+        layout = SKIP_LAYOUTS[marker]
+        if layout is not None:
+            size, n = layout
+            offset += size
+            count += n
+        elif marker in SIZED_VALUE_LAYOUTS:
+            width, multiple, is_bytes = SIZED_VALUE_LAYOUTS[marker]
+            size = multiple * int.from_bytes(data[offset:offset + width], "big")
+            offset += width
+            if is_bytes:
+                offset += size
+            elif multiple == 1 and size >= BULK_THRESHOLD:
+                end = _skip_uniform_items(data, offset, size)
+                if end is None:
+                    count += size
+                else:
+                    offset = end
+            else:
+                count += size
+        else:
+            raise ValueError("Unknown PackStream marker %02X" % marker)
+    if offset > len(data):
+        raise IndexError("Incomplete PackStream value")
+    return offset
+
+
+def _skip_uniform_items(data, offset, count):
+    """ Return the offset just past `count` list items starting at
+    `offset`, if these are all scalar values of the same encoded size,
+    which can be checked without stepping through them one by one.
+    Otherwise, return None.
+    """
+    layout = SKIP_LAYOUTS[data[offset]]
+    if layout is None or layout[1]:
+        return None
+    stride = 1 + layout[0]
+    end = offset + stride * count
+    if stride == 1:
+        if bytes(data[offset:end]).translate(None, SINGLE_BYTE_VALUE_MARKERS):
+            return None
+    elif data[offset:end:stride] != SINGLE_BYTES[data[offset]] * count:
+        return None
+    return end
+
+
+class AsyncUnpacker(object):
+    """ Unpacker that reads PackStream values from an
+    :class:`asyncio.StreamReader`.
+
+    Each value is read by following its markers and sizes, awaiting
+    exactly as many bytes as the value occupies, and is then decoded
+    with an :class:`.Unpacker`. Nothing beyond the end of the value is
+    read from the stream.
+
+    :param reader: :class:`asyncio.StreamReader`, or any object with an
+        equivalent `readexactly` coroutine method
+    :param typed_lists: as for :class:`.Unpacker`
+    :param hydrators: dictionary mapping structure tags to hydrator
+        functions, as for :class:`.Unpacker`
+    """
+
+    def __init__(self, reader, typed_lists=False, hydrators=None):
+        self._reader = reader
+        self._typed_lists = typed_lists
+        self._hydrators = hydrators
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.unpack()
+        except EOFError:
+            raise StopAsyncIteration
+
+    async def unpack(self):
+        """ Read and return the next value from the stream.
+
+        :raises EOFError: if the stream ends before another value
+            begins
+        :raises ValueError: if the stream ends part way through a
+            value
+        """
+        data = bytearray()
+        try:
+            await self._read_values(data, 1)
+        except EOFError:
+            # Includes asyncio.IncompleteReadError
+            if data:
+                raise ValueError("Incomplete PackStream value at end of stream")
+            raise EOFError("End of stream")
+        return Unpacker(data, typed_lists=self._typed_lists, hydrators=self._hydrators).unpack()
+
+    async def _read_values(self, data, count):
+        """ Read the encoded bytes of `count` consecutive values onto
+        the end of `data`. The items of lists, dictionaries and
+        structures are simply added to the count of values still to be
+        read, as they follow their header directly.
+        """
+        read = self._reader.readexactly
+        while count:
+            count -= 1
+            marker = (await read(1))[0]
+            data.append(marker)
+            layout = SKIP_LAYOUTS[marker]
+            if layout is not None:
+                size, n = layout
+                if size:
+                    data += await read(size)
+                count += n
+            elif marker in SIZED_VALUE_LAYOUTS:
+                width, multiple, is_bytes = SIZED_VALUE_LAYOUTS[marker]
+                header = await read(width)
+                data += header
+                size = multiple * int.from_bytes(header, "big")
+                if is_bytes:
+                    data += await read(size)
+                else:
+                    count += size
+            else:
+                raise ValueError("Unknown PackStream marker %02X" % marker)
+
+
+class AsyncPacker(object):
+    """ Packer that writes PackStream values to an
+    :class:`asyncio.StreamWriter`.
+
+    Values are packed into a buffer that is reused between calls, then
+    written to the stream in one go. Each call waits on the writer's
+    `drain` method, so that a peer that reads slowly holds up the
+    producer rather than letting the transport buffer grow.
+
+    :param writer: :class:`asyncio.StreamWriter`, or any object with
+        equivalent `write` and `drain` methods
+    :param version: Bolt protocol version, as for :class:`.Packer`
+    :param dehydrators: dictionary mapping types to dehydrator
+        functions, as for :class:`.Packer`
+    """
+
+    def __init__(self, writer, version=(), dehydrators=None):
+        self._writer = writer
+        self._packer = Packer(version=version, dehydrators=dehydrators)
+
+    async def pack(self, *values):
+        """ Pack values and write them to the stream, waiting until
+        the stream is ready to accept more data.
+        """
+        packer = self._packer
+        packer.reset()
+        for value in values:
+            packer.pack(value)
+        # The transport may hold on to the data written, so hand it a
+        # copy rather than a view of the reused buffer
+        with packer.view() as data:
+            self._writer.write(data.tobytes())
+        await self._writer.drain()
+
 
 def pack(*values, **kwargs):
     buffer = BytesIO()
@@ -630,10 +2429,192 @@ def pack(*values, **kwargs):
     return buffer.getvalue()
 
 
-def unpack(data, offset=0):
-    s = Unpacker(data, offset)
-    while True:
-        try:
-            yield s.unpack()
-        except IndexError:
-            break
+def unpack(data, offset=0, zero_copy=False, typed_lists=False, hydrators=None, lazy=False,
+           select=None, key_cache=None, string_cache=None):
+    s = Unpacker(data, offset, zero_copy, typed_lists, hydrators, lazy, key_cache, string_cache)
+    if select is None:
+        while True:
+            try:
+                yield s.unpack()
+            except IndexError:
+                break
+    else:
+        # Decode only the selected paths of each value (see
+        # `Unpacker.select`)
+        selection = _compile_selection(select)
+        while True:
+            result = {}
+            try:
+                s._select(selection, result)
+            except IndexError:
+                break
+            yield result
+
+
+# Markers of lists with a size field, mapped to the width of that field
+LIST_SIZE_WIDTHS = {0xD4: 1, 0xD5: 2, 0xD6: 4}
+
+
+def unpack_parallel(data, workers=None, typed_lists=False, hydrators=None, executor=None):
+    """ Unpack all values from `data`, decoding them in parallel across
+    several processes, and return them as a list.
+
+    The data is first scanned to find the boundaries between values,
+    without decoding them. The values are then divided into batches of
+    similar size, each decoded by a worker process that reads it from
+    a shared memory copy of the data, so that no encoded data needs to
+    be sent to the workers. If the data holds a single list, the items
+    of that list are divided between workers instead.
+
+    Only the decoded values are sent back from the workers, so this
+    pays off for large batches of records that are expensive to
+    decode, rather than for large strings or byte arrays. On Python
+    3.7, which lacks shared memory support, the data is decoded in
+    this process instead.
+
+    :param data: encoded data
+    :param workers: number of worker processes, defaulting to the
+        number of CPUs
+    :param typed_lists: as for :class:`.Unpacker`
+    :param hydrators: dictionary mapping structure tags to hydrator
+        functions, as for :class:`.Unpacker`; these must be picklable
+    :param executor: existing :class:`concurrent.futures.ProcessPoolExecutor`
+        to use, rather than starting new processes for this call
+    :return: list of values
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    boundaries, in_list = _value_boundaries(data)
+    batches = _batch_boundaries(boundaries, 4 * workers)
+    try:
+        from multiprocessing.shared_memory import SharedMemory
+    except ImportError:
+        # Python 3.7
+        workers = 1
+    if len(batches) <= 1 or workers <= 1:
+        return list(unpack(data, typed_lists=typed_lists, hydrators=hydrators))
+    from concurrent.futures import ProcessPoolExecutor
+    shared = SharedMemory(create=True, size=len(data))
+    try:
+        shared.buf[:len(data)] = data
+        starts, ends = zip(*batches)
+        n = len(batches)
+        args = ([shared.name] * n, starts, ends, [typed_lists] * n, [hydrators] * n)
+        if executor is None:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(_unpack_shared, *args))
+        else:
+            results = list(executor.map(_unpack_shared, *args))
+    finally:
+        shared.close()
+        shared.unlink()
+    values = [value for result in results for value in result]
+    if in_list:
+        if typed_lists:
+            values = _typed_list(values)
+        return [values]
+    else:
+        return values
+
+
+def _value_boundaries(data):
+    """ Return the offsets at which the top-level values in `data`
+    start, and the offset at which they end, as a list. If `data` holds
+    a single list, return the boundaries of the items of that list
+    instead. A flag indicating which of these was done is also
+    returned.
+    """
+    end = len(data)
+    boundaries = [0]
+    offset = 0
+    while offset < end:
+        offset = _skip_values(data, offset, 1)
+        boundaries.append(offset)
+    if len(boundaries) == 2 and end:
+        marker = data[0]
+        if 0x90 <= marker < 0xA0:
+            count, offset = marker - 0x90, 1
+        elif marker in LIST_SIZE_WIDTHS:
+            offset = 1 + LIST_SIZE_WIDTHS[marker]
+            count = int.from_bytes(data[1:offset], "big")
+        else:
+            return boundaries, False
+        boundaries = [offset]
+        for _ in range(count):
+            offset = _skip_values(data, offset, 1)
+            boundaries.append(offset)
+        return boundaries, True
+    return boundaries, False
+
+
+def _batch_boundaries(boundaries, n):
+    """ Divide the values delimited by `boundaries` into at most `n`
+    contiguous batches of similar encoded size, returned as a list of
+    (start, end) offset pairs.
+    """
+    if len(boundaries) < 2:
+        return []
+    start = boundaries[0]
+    target = (boundaries[-1] - start) / n
+    batches = []
+    for boundary in boundaries[1:-1]:
+        if boundary - start >= target:
+            batches.append((start, boundary))
+            start = boundary
+    batches.append((start, boundaries[-1]))
+    return batches
+
+
+def _unpack_shared(name, start, end, typed_lists, hydrators):
+    """ Unpack the values between two offsets of the data held in a
+    named shared memory block. This runs in a worker process.
+    """
+    shared = _attach_shared(name)
+    try:
+        data = bytes(shared.buf[start:end])
+    finally:
+        shared.close()
+    return list(unpack(data, typed_lists=typed_lists, hydrators=hydrators))
+
+
+# Whether this worker process runs a resource tracker of its own,
+# rather than sharing that of its parent (see `_has_own_resource_tracker`)
+_OWN_RESOURCE_TRACKER = None
+
+
+def _attach_shared(name):
+    """ Attach to a named shared memory block from a worker process,
+    leaving its cleanup to the process that created it.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+    if version_info >= (3, 13):
+        return SharedMemory(name, track=False)
+    # Before Python 3.13, attaching to a block also registers it with
+    # the resource tracker, which then unlinks it when the attaching
+    # process exits (CPython issue 82300, formerly bpo-39959). Workers
+    # usually share the tracker of their parent, which holds that same
+    # registration and must keep it for the parent to unlink the block
+    # cleanly. Only a tracker of the worker's own is told to forget it.
+    untrack = os_name == "posix" and _has_own_resource_tracker()
+    shared = SharedMemory(name)
+    if untrack:
+        from multiprocessing import resource_tracker
+        # The tracker knows POSIX blocks by their name with a leading slash
+        resource_tracker.unregister("/" + shared.name, "shared_memory")
+    return shared
+
+
+def _has_own_resource_tracker():
+    """ Return whether this worker process has a resource tracker of
+    its own. That is the case if it started before its parent's
+    tracker was running, and so did not inherit a connection to it.
+    This is decided before the worker first attaches to a block, as
+    attaching starts a tracker if none is connected.
+    """
+    global _OWN_RESOURCE_TRACKER
+    if _OWN_RESOURCE_TRACKER is None:
+        from multiprocessing import resource_tracker
+        # No public API reports this, so it is read from the tracker
+        # instance to which the module functions delegate
+        _OWN_RESOURCE_TRACKER = resource_tracker._resource_tracker._fd is None
+    return _OWN_RESOURCE_TRACKER
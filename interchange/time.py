@@ -23,6 +23,7 @@ from platform import uname
 from re import compile as re_compile
 from time import gmtime, mktime, struct_time
 
+from interchange._lazy import lazy_attributes
 from interchange.math import (
     MIN_INT64, MAX_INT64, 
     nano_add, nano_sub, nano_mul, nano_div, nano_mod, nano_divmod,
@@ -33,14 +34,33 @@ from interchange.math import (
 MIN_YEAR = 1
 MAX_YEAR = 9999
 
-# Set of all leap years between MIN_YEAR and MAX_YEAR
-LEAP_YEARS = {year for year in range(MIN_YEAR, MAX_YEAR + 1)
-              if (year % 4 == 0 and year % 100 != 0) or (year % 400 == 0)}
+# Number of days in each month of a common (non-leap) year
+COMMON_DAYS_IN_MONTH = (None, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _days_in_month(year, month):
+    if month == 2 and _is_leap_year(year):
+        return 29
+    return COMMON_DAYS_IN_MONTH[month]
+
+
+# Calendar lookup tables, kept for backward compatibility and built on
+# first access; calendar calculations use `_days_in_month` instead
+_LAZY_TABLES = {
+    # Set of all leap years between MIN_YEAR and MAX_YEAR
+    "LEAP_YEARS": lambda: {year for year in range(MIN_YEAR, MAX_YEAR + 1)
+                           if _is_leap_year(year)},
+    "DAYS_IN_MONTH": lambda: {(year, month): _days_in_month(year, month)
+                              for year in range(MIN_YEAR, MAX_YEAR + 1)
+                              for month in range(1, 13)},
+}
+
+__getattr__ = lazy_attributes(globals(), _LAZY_TABLES)
 
-DAYS_IN_MONTH = {(year, month): (30 if month in (9, 4, 6, 11) else
-                                 31 if month != 2 else
-                                 29 if year in LEAP_YEARS else 28)
-                 for year in range(MIN_YEAR, MAX_YEAR + 1) for month in range(1, 13)}
 
 try:
     from time import time_ns as __time_ns
@@ -440,7 +460,7 @@ class Date(object):
         self.__year = int(year)
         self.__month = int(month)
         day = int(day)
-        days_in_month = DAYS_IN_MONTH[(year, month)]
+        days_in_month = _days_in_month(self.__year, self.__month)
         if day in (days_in_month, -1):
             self.__day = -1
         elif day in (days_in_month - 1, -2):
@@ -493,30 +513,14 @@ class Date(object):
         if ordinal == 0:
             year = month = day = 0
         else:
-            if ordinal >= 719163:
-                year = 1970     # Unix epoch
-                month = 1
-                day = int(ordinal - 719162)
-            else:
-                year = 1
-                month = 1
-                day = int(ordinal)
-            if day < 1 or day > 3652059:
+            if ordinal < 1 or ordinal > 3652059:
                 # Note: this requires a maximum of 22 bits for storage
                 # Could be transferred in 3 bytes.
                 raise ValueError("Ordinal out of range (1..3652059)")
-            if year < MIN_YEAR or year > MAX_YEAR:
-                raise ValueError("Year out of range (%d..%d)" % (MIN_YEAR, MAX_YEAR))
-            days_in_year = Date.days_in_year(year)
-            while day > days_in_year:
-                day -= days_in_year
-                year += 1
-                days_in_year = Date.days_in_year(year)
-            days_in_month = DAYS_IN_MONTH[(year, month)]
-            while day > days_in_month:
-                day -= days_in_month
-                month += 1
-                days_in_month = DAYS_IN_MONTH[(year, month)]
+            # The built-in date class does this in constant time, and
+            # faster than a long-hand pure Python algorithm could
+            native = date.fromordinal(int(ordinal))
+            year, month, day = native.year, native.month, native.day
         obj = cls(year, month, day)
         obj.__ordinal = ordinal
         return obj
@@ -577,13 +581,13 @@ class Date(object):
     def is_leap_year(cls, year):
         if year < MIN_YEAR or year > MAX_YEAR:
             raise ValueError("Year out of range (%d..%d)" % (MIN_YEAR, MAX_YEAR))
-        return year in LEAP_YEARS
+        return _is_leap_year(year)
 
     @classmethod
     def days_in_year(cls, year):
         if year < MIN_YEAR or year > MAX_YEAR:
             raise ValueError("Year out of range (%d..%d)" % (MIN_YEAR, MAX_YEAR))
-        return 366 if year in LEAP_YEARS else 365
+        return 366 if _is_leap_year(year) else 365
 
     @classmethod
     def days_in_month(cls, year, month):
@@ -591,7 +595,7 @@ class Date(object):
             raise ValueError("Year out of range (%d..%d)" % (MIN_YEAR, MAX_YEAR))
         if month < 1 or month > 12:
             raise ValueError("Month out of range (1..12)")
-        return DAYS_IN_MONTH[(year, month)]
+        return _days_in_month(year, month)
 
     # CLASS ATTRIBUTES #
 
@@ -1210,6 +1214,8 @@ class DateTime(object):
 
     # INSTANCE ATTRIBUTES #
 
+    __clock_time = None
+
     @property
     def year(self):
         return self.__date.year
@@ -1373,14 +1379,13 @@ class DateTime(object):
         return self.__date.to_ordinal()
 
     def to_clock_time(self):
-        total_seconds = 0
-        for year in range(1, self.year):
-            total_seconds += 86400 * Date.days_in_year(year)
-        for month in range(1, self.month):
-            total_seconds += 86400 * Date.days_in_month(self.year, month)
-        total_seconds += 86400 * (self.day - 1)
-        seconds, nanoseconds = nano_divmod(self.__time.ticks, 1)
-        return Clock(total_seconds + seconds, 1000000000 * nanoseconds)
+        if self.__clock_time is None:
+            # Count whole days from the ordinal, rather than summing
+            # the lengths of every preceding year and month
+            total_seconds = 86400 * (self.__date.to_ordinal() - 1)
+            seconds, nanoseconds = nano_divmod(self.__time.ticks, 1)
+            self.__clock_time = Clock(total_seconds + seconds, 1000000000 * nanoseconds)
+        return self.__clock_time
 
     def to_native(self):
         """ Convert to a native Python `datetime.datetime` value.
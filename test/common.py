@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from json import loads
+from os import path
+from subprocess import check_output
+from sys import executable
+
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Imports the named module in a fresh interpreter, after its
+# dependencies, and reports the time taken and memory allocated by
+# that import. Of the memory, "own_size" counts only what is still
+# held by allocations made in the module's own source file, leaving
+# out the import machinery and any standard library modules it loads.
+IMPORT_SCRIPT = """\
+import json, sys, time, tracemalloc
+import pytz, six
+import interchange.geo, interchange.math
+{dependencies}
+tracemalloc.start()
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+size, peak = tracemalloc.get_traced_memory()
+own = tracemalloc.take_snapshot().filter_traces(
+    [tracemalloc.Filter(True, sys.modules["{module}"].__file__)])
+own_size = sum(stat.size for stat in own.statistics("filename"))
+print(json.dumps({{"seconds": t1 - t0, "size": size, "peak": peak, "own_size": own_size}}))
+"""
+
+
+def measure_import(module, dependencies):
+    script = IMPORT_SCRIPT.format(module=module,
+                                  dependencies="\n".join("import %s" % d for d in dependencies))
+    output = check_output([executable, "-c", script], cwd=ROOT)
+    return loads(output.decode("utf-8"))
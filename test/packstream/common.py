@@ -89,6 +89,21 @@ class FakeDict(OrderedDict):
         return self.size
 
 
+class TrickleReader(object):
+    """ File-like object that only ever returns a single byte per read.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def read(self, n=-1):
+        q = self._offset + min(n, 1)
+        chunk = self._data[self._offset:q]
+        self._offset = q
+        return chunk
+
+
 STR_S = "A" * 0x10
 STR_S_DATA = b"\xD0\x10" + b"A" * 0x10
 
@@ -141,3 +156,6 @@ DICT_L_DATA = (bytearray([0xDA, 0x00, 0x01, 0x00, 0x00]) +
                         for key in DICT_L_KEYS))
 
 DICT_XL = FakeDict(0x100000000)
+
+ASCII_TEXT = ["name", "Node 123", "ACTIVE", "x" * 40, "label"] * 200
+MULTIBYTE_TEXT = ["h\u00e9llo", "w\u00f6rld", "\u65e5\u672c\u8a9e", "\u00fcn\u00efc\u00f6d\u00e9" * 6, "\u00df"] * 200
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from asyncio import gather, open_connection, run, StreamReader
+from socket import socketpair
+
+from pytest import mark, raises
+
+from interchange.packstream import pack, unpack, AsyncPacker, AsyncUnpacker, Structure
+
+from .common import STR_L, LIST_M, DICT_M
+
+
+VALUES = [None, True, False, 1, -0x10, -0x80, 0x8000, -0x80000000, 2 ** 40, 3.14,
+          "", "hello", STR_L, bytearray(b"\x00\x01"), LIST_M, DICT_M, Structure(0x4E, 1, ["X"], {}),
+          [1, ["two", {"three": 3.0}]]]
+
+DATA = pack(*VALUES)
+
+
+def unpack_from_stream(data, **kwargs):
+
+    async def read():
+        reader = StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return [value async for value in AsyncUnpacker(reader, **kwargs)]
+
+    return run(read())
+
+
+def test_unpack_from_stream():
+    assert unpack_from_stream(DATA) == VALUES
+
+
+def test_unpack_reads_only_one_value():
+
+    async def read():
+        reader = StreamReader()
+        reader.feed_data(pack([1, 2], "x"))
+        reader.feed_eof()
+        value = await AsyncUnpacker(reader).unpack()
+        return value, await reader.read()
+
+    assert run(read()) == ([1, 2], pack("x"))
+
+
+def test_unpack_typed_lists():
+    data = pack(list(range(0x100)))
+    assert unpack_from_stream(data, typed_lists=True) == list(unpack(data, typed_lists=True))
+
+
+def test_unpack_with_hydrators():
+    data = pack(Structure(0x4E, 1))
+    assert unpack_from_stream(data, hydrators={0x4E: lambda n: n}) == [1]
+
+
+def test_unpack_incomplete_value():
+    with raises(ValueError):
+        _ = unpack_from_stream(pack([1, "hello"])[:-1])
+
+
+def test_unpack_unknown_marker():
+    with raises(ValueError):
+        _ = unpack_from_stream(b"\xDF")
+
+
+def test_pack_and_unpack_over_socket():
+
+    async def write(writer):
+        packer = AsyncPacker(writer)
+        for value in VALUES:
+            await packer.pack(value)
+        await packer.pack(1, 2, 3)
+        writer.close()
+        await writer.wait_closed()
+
+    async def read(reader):
+        return [value async for value in AsyncUnpacker(reader)]
+
+    async def exchange():
+        s1, s2 = socketpair()
+        _, writer = await open_connection(sock=s1)
+        reader, reader_writer = await open_connection(sock=s2)
+        _, values = await gather(write(writer), read(reader))
+        reader_writer.close()
+        await reader_writer.wait_closed()
+        return values
+
+    assert run(exchange()) == VALUES + [1, 2, 3]
+
+
+RECORDS = [[i, "Node %d" % i, {"score": 0.5, "tags": ["a", "b"]}] for i in range(1000)]
+
+
+@mark.parametrize("stream", [False, True], ids=["unpack", "async-unpacker"])
+def test_unpack_records(benchmark, stream):
+    benchmark.group = "async-unpack"
+    data = pack(*RECORDS)
+    if stream:
+        benchmark(unpack_from_stream, data)
+    else:
+        benchmark(lambda: list(unpack(data)))
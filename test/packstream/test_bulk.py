@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from array import array
+from datetime import date
+from io import BytesIO
+from random import Random
+from struct import error as struct_error
+
+from pytest import mark, raises
+
+from interchange.packstream import pack, unpack, Packer, Unpacker
+from interchange.time import Date
+
+
+_random = Random(0)
+
+INTEGERS = [_random.choice([0, -0x10, 0x7F, -0x80, 0x7FFF, -0x8000, 0x80000000,
+                            -0x80000000, 0x7FFFFFFFFFFFFFFF, -0x8000000000000000])
+            for _ in range(0x1000)]
+
+TINY_INTEGERS = [_random.randint(-0x10, 0x7F) for _ in range(0x1000)]
+
+SHORT_INTEGERS = [_random.randint(-0x8000, 0x7FFF) for _ in range(0x1000)]
+
+INT_16_INTEGERS = [_random.randint(0x80, 0x7FFF) for _ in range(0x1000)]
+
+FLOATS = ([_random.uniform(-1e10, 1e10) for _ in range(0x1000)] +
+          [0.0, -0.0, float("inf"), float("-inf"), float("nan")])
+
+DATES = [Date.from_ordinal(_random.randint(1, 3652059)) for _ in range(0x1000)]
+
+NATIVE_DATES = [date.fromordinal(_random.randint(1, 3652059)) for _ in range(0x1000)]
+
+
+def pack_items_one_by_one(values, version=()):
+    """ Reference encoding of a list, packing each item individually.
+    """
+    header = pack([None] * len(values))[:-len(values)]
+    return header + b"".join(pack(value, version=version) for value in values)
+
+
+def pack_many(values, version=()):
+    buffer = BytesIO()
+    Packer(buffer, version=version).pack_many(values)
+    return buffer.getvalue()
+
+
+@mark.parametrize("values", [INTEGERS, TINY_INTEGERS, SHORT_INTEGERS, FLOATS],
+                  ids=["integers", "tiny-integers", "short-integers", "floats"])
+def test_homogeneous_list_is_byte_identical(values):
+    assert pack(values) == pack_items_one_by_one(values)
+
+
+@mark.parametrize("values", [DATES, NATIVE_DATES], ids=["dates", "native-dates"])
+def test_homogeneous_date_list_is_byte_identical(values):
+    assert pack(values, version=(2, 0)) == pack_items_one_by_one(values, version=(2, 0))
+
+
+def test_date_list_requires_bolt_2():
+    with raises(TypeError):
+        _ = pack(DATES, version=(1, 0))
+
+
+@mark.parametrize("size", [3, 0x20])
+@mark.parametrize("values", [DATES, NATIVE_DATES], ids=["dates", "native-dates"])
+def test_date_list_with_dehydrator(values, size):
+    dehydrators = {type(values[0]): lambda d: d.year}
+    b = pack(values[:size], version=(2, 0), dehydrators=dehydrators)
+    assert b == pack([d.year for d in values[:size]])
+
+
+def test_mixed_list_is_byte_identical():
+    values = INTEGERS[:0x100] + FLOATS[:0x100] + [True, None, "x"]
+    assert pack(values) == pack_items_one_by_one(values)
+
+
+def test_integer_out_of_range():
+    with raises(ValueError):
+        _ = pack([0] * 0x20 + [0x8000000000000000])
+
+
+@mark.parametrize("typecode", "bBhHiIlLqQ")
+def test_integer_array(typecode):
+    values = array(typecode, range(0x80))
+    assert pack(values) == pack(values.tolist())
+    assert pack_many(values) == pack(values.tolist())
+
+
+@mark.parametrize("typecode", "fd")
+def test_float_array(typecode):
+    values = array(typecode, [0.5 * i for i in range(-0x40, 0x40)])
+    assert pack(values) == pack(values.tolist())
+
+
+def test_empty_array():
+    assert pack(array("d")) == b"\x90"
+
+
+def test_pack_many_from_buffer():
+    values = array("q", SHORT_INTEGERS)
+    assert pack_many(memoryview(values)) == pack(SHORT_INTEGERS)
+
+
+def test_pack_many_from_multidimensional_buffer():
+    view = memoryview(array("d", [1.0, 2.0, 3.0, 4.0])).cast("B").cast("d", (2, 2))
+    assert pack_many(view) == pack([[1.0, 2.0], [3.0, 4.0]])
+
+
+def test_pack_many_from_list():
+    assert pack_many(FLOATS) == pack(FLOATS)
+
+
+@mark.parametrize("values", [INTEGERS, FLOATS, DATES], ids=["integers", "floats", "dates"])
+def test_pack_homogeneous_list(benchmark, values):
+    benchmark.group = "pack-homogeneous-list"
+    assert benchmark(pack, values, version=(2, 0)) == pack_items_one_by_one(values, version=(2, 0))
+
+
+class ItemwisePacker(Packer):
+    """ Packer without bulk encoding, as a baseline for comparison.
+    """
+
+    def _pack_items(self, items):
+        for item in items:
+            self.pack(item)
+
+
+@mark.parametrize("values", [INTEGERS, FLOATS, DATES], ids=["integers", "floats", "dates"])
+def test_pack_homogeneous_list_item_by_item(benchmark, values):
+    benchmark.group = "pack-homogeneous-list"
+
+    def pack_item_by_item():
+        buffer = BytesIO()
+        ItemwisePacker(buffer, version=(2, 0)).pack(values)
+        return buffer.getvalue()
+
+    assert benchmark(pack_item_by_item) == pack_items_one_by_one(values, version=(2, 0))
+
+
+@mark.parametrize("values", [INTEGERS, TINY_INTEGERS, SHORT_INTEGERS, FLOATS,
+                             [-0x80] * 0x100, INT_16_INTEGERS, [0x7FFFFFFF] * 0x100, [0x80000000] * 0x100],
+                  ids=["integers", "tiny-integers", "short-integers", "floats",
+                       "int-8", "int-16", "int-32", "int-64"])
+def test_unpack_typed_list(values):
+    unpacked = next(unpack(pack(values), typed_lists=True))
+    assert isinstance(unpacked, array)
+    assert unpacked.typecode == ("d" if isinstance(values[0], float) else "q")
+    assert unpacked.tobytes() == array(unpacked.typecode, values).tobytes()
+
+
+def test_unpack_typed_list_zero_copy():
+    unpacked = next(unpack(pack(SHORT_INTEGERS), zero_copy=True, typed_lists=True))
+    assert unpacked == array("q", SHORT_INTEGERS)
+
+
+def test_unpack_typed_list_of_other_values():
+    values = [[], [1, 2.0], ["a", "b"], [True, False], [None], [[1, 2], [3.0]]]
+    unpacked = next(unpack(pack(values), typed_lists=True))
+    assert unpacked == [[], [1, 2.0], ["a", "b"], [True, False], [None],
+                        [array("q", [1, 2]), array("d", [3.0])]]
+
+
+def test_unpack_typed_list_followed_by_other_values():
+    data = pack([1, 2, 3], [1.5], "three")
+    assert list(unpack(data, typed_lists=True)) == [array("q", [1, 2, 3]), array("d", [1.5]), "three"]
+
+
+@mark.parametrize("following", [b"", b"\x01", b"\xC1" + bytes(8)], ids=["end", "integer", "float"])
+@mark.parametrize("header", [b"\x90", b"\xD4\x00", b"\xD5\x00\x00", b"\xD6\x00\x00\x00\x00"],
+                  ids=["tiny", "list-8", "list-16", "list-32"])
+def test_unpack_empty_typed_list(header, following):
+    unpacker = Unpacker(header + following, typed_lists=True)
+    unpacked = unpacker.unpack()
+    assert unpacked == [] and isinstance(unpacked, list)
+    assert unpacker._offset == len(header)
+
+
+def test_unpack_truncated_typed_list():
+    with raises((IndexError, struct_error)):
+        Unpacker(pack([1.5] * 4)[:-1], typed_lists=True).unpack()
+
+
+@mark.parametrize("typed_lists", [False, True])
+@mark.parametrize("values", [SHORT_INTEGERS, INT_16_INTEGERS, FLOATS],
+                  ids=["mixed-width-integers", "int-16", "floats"])
+def test_unpack_numeric_list(benchmark, values, typed_lists):
+    benchmark.group = "unpack-numeric-list"
+    data = pack(values * 0x10)
+    assert len(benchmark(lambda: Unpacker(data, typed_lists=typed_lists).unpack())) == 0x10 * len(values)
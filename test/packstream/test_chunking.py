@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from io import BytesIO
+from socket import socketpair
+from threading import Thread
+
+from pytest import mark, raises
+
+from interchange.packstream import ChunkedReader, ChunkedWriter, Structure
+
+from .common import STR_L, LIST_M, DICT_M, TrickleReader
+
+
+MESSAGES = [Structure(0x10, "RETURN 1", {}, {}), Structure(0x3F), None, 1,
+            STR_L, LIST_M, DICT_M, [1, ["two", {"three": 3.0}]]]
+
+
+def write_messages(messages, **kwargs):
+    buffer = BytesIO()
+    writer = ChunkedWriter(buffer, **kwargs)
+    for message in messages:
+        writer.write(message)
+    return buffer.getvalue()
+
+
+def test_single_chunk_message():
+    data = write_messages([Structure(0x3F)])
+    assert data == b"\x00\x02\xB0\x3F\x00\x00"
+
+
+def test_multiple_chunk_message():
+    data = write_messages(["hello, world"], max_chunk_size=5)
+    assert data == (b"\x00\x05\x8Chell" b"\x00\x05o, wo" b"\x00\x03rld" b"\x00\x00")
+
+
+def test_chunk_size_limits():
+    with raises(ValueError):
+        _ = ChunkedWriter(BytesIO(), max_chunk_size=0)
+    with raises(ValueError):
+        _ = ChunkedReader(BytesIO(), max_chunk_size=0x10000)
+
+
+@mark.parametrize("max_chunk_size", [1, 7, 0x100, 0xFFFF])
+def test_round_trip(max_chunk_size):
+    data = write_messages(MESSAGES, max_chunk_size=max_chunk_size)
+    assert list(ChunkedReader(BytesIO(data))) == MESSAGES
+
+
+def test_read_with_small_reads():
+    data = write_messages(MESSAGES, max_chunk_size=100)
+    assert list(ChunkedReader(BytesIO(data), read_size=3)) == MESSAGES
+
+
+def test_read_from_read_source():
+    data = write_messages(MESSAGES, max_chunk_size=100)
+    assert list(ChunkedReader(TrickleReader(data))) == MESSAGES
+
+
+def test_read_skips_empty_messages():
+    data = b"\x00\x00" + write_messages([1]) + b"\x00\x00\x00\x00" + write_messages([2])
+    assert list(ChunkedReader(BytesIO(data))) == [1, 2]
+
+
+def test_read_over_socket():
+    s1, s2 = socketpair()
+    writer = ChunkedWriter(s1, max_chunk_size=1000)
+
+    def send():
+        for message in MESSAGES:
+            writer.write(message)
+        s1.close()
+
+    thread = Thread(target=send)
+    thread.start()
+    try:
+        assert list(ChunkedReader(s2)) == MESSAGES
+    finally:
+        thread.join()
+        s2.close()
+
+
+def test_read_chunk_too_large():
+    data = write_messages(["hello, world"])
+    with raises(ValueError):
+        _ = ChunkedReader(BytesIO(data), max_chunk_size=5).read()
+
+
+def test_read_incomplete_message():
+    data = write_messages([STR_L], max_chunk_size=100)
+    reader = ChunkedReader(BytesIO(data[:-2]))
+    with raises(ValueError):
+        _ = reader.read()
+
+
+def test_read_message_with_trailing_data():
+    reader = ChunkedReader(BytesIO(b"\x00\x02\x01\x02\x00\x00"))
+    with raises(ValueError):
+        _ = reader.read()
+
+
+def test_read_truncated_value():
+    reader = ChunkedReader(BytesIO(b"\x00\x01\xD0\x00\x00"))
+    with raises(ValueError):
+        _ = reader.read()
+
+
+def test_read_at_end_of_stream():
+    reader = ChunkedReader(BytesIO(b""))
+    with raises(EOFError):
+        _ = reader.read()
+
+
+RECORDS = [Structure(0x71, [i, "Node %d" % i, {"score": 0.5}]) for i in range(1000)]
+
+LARGE_MESSAGES = [list(range(0x8000))] * 10
+
+
+@mark.parametrize("messages", [RECORDS, LARGE_MESSAGES], ids=["records", "large"])
+def test_write_throughput(benchmark, messages):
+    benchmark.group = "chunked-write"
+    benchmark(write_messages, messages)
+
+
+@mark.parametrize("messages", [RECORDS, LARGE_MESSAGES], ids=["records", "large"])
+def test_read_throughput(benchmark, messages):
+    benchmark.group = "chunked-read"
+    data = write_messages(messages)
+    assert benchmark(lambda: list(ChunkedReader(BytesIO(data)))) == messages
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from subprocess import check_output
+from sys import executable
+
+from pytest import mark
+
+from ..common import ROOT, measure_import
+
+
+@mark.parametrize("module,dependencies", [
+    ("interchange.packstream", ["interchange.time"]),
+])
+def test_import_time_and_memory(benchmark, module, dependencies):
+    benchmark.group = "import"
+    result = benchmark.pedantic(measure_import, args=(module, dependencies), rounds=5)
+    benchmark.extra_info.update(result)
+    assert result["own_size"] < 0x100000
+
+
+def test_large_tables_are_not_built_on_import():
+    script = ("import interchange.packstream as packstream; "
+              "print(sorted(set(packstream._LAZY_TABLES) & set(vars(packstream))))")
+    assert check_output([executable, "-c", script], cwd=ROOT) == b"[]\n"
+
+
+def test_large_tables_are_built_on_demand():
+    import interchange.packstream as packstream
+    assert packstream.INT_DATA[-0x8000] == b"\xC9\x80\x00"
+    assert packstream.INT_DATA[0x7F] == b"\x7F"
+    assert packstream.STR_M_HEAD[0x100] == b"\xD1\x01\x00"
+    assert packstream.UNPACKED_UINT_16[b"\xFF\xFF"] == 0xFFFF
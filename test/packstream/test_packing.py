@@ -16,11 +16,19 @@
 # limitations under the License.
 
 
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from io import BytesIO
+
 from pytest import mark, raises
 
-from interchange.packstream import pack, Packer
+from interchange.geo import CartesianPoint
+from interchange.packstream import pack, Packer, Structure, EncodedStringCache, RecordEncoder
+from interchange.time import Date, DateTime, Duration, Time
 
 from .common import (
+    ASCII_TEXT, MULTIBYTE_TEXT,
     STR_S, STR_S_DATA,
     STR_M, STR_M_DATA,
     STR_L, STR_L_DATA,
@@ -215,3 +223,377 @@ def test_pack_dict_with_non_string_key():
 def test_pack_unknown_type(version):
     with raises(TypeError):
         _ = pack(object(), version=version)
+
+
+class Celsius(float):
+    pass
+
+
+class Tags(list):
+    pass
+
+
+class Money(object):
+
+    def __init__(self, amount, currency):
+        self.amount = amount
+        self.currency = currency
+
+
+class Coin(Money):
+    pass
+
+
+def test_pack_subclass_of_native_type():
+    assert pack(Celsius(1.5)) == pack(1.5)
+    assert pack(Tags(["a", "b"])) == pack(["a", "b"])
+
+
+def test_pack_subclass_of_temporal_type():
+    assert pack(Duration(days=1), version=(2, 0)) == b"\xB4E\x00\x01\x00\x00"
+
+
+def test_register_dehydrator():
+    buffer = BytesIO()
+    packer = Packer(buffer)
+    with raises(TypeError):
+        packer.pack(Money(1, "GBP"))
+    packer.register_dehydrator(Money, lambda m: Structure(b"M", m.amount, m.currency))
+    packer.pack(Money(1, "GBP"))
+    assert buffer.getvalue() == b"\xB2M\x01\x83GBP"
+
+
+def test_dehydrator_applies_to_subclasses():
+    b = pack(Coin(1, "GBP"), dehydrators={Money: lambda m: [m.amount, m.currency]})
+    assert b == pack([1, "GBP"])
+
+
+def test_dehydrator_for_subclass_takes_precedence():
+    b = pack([Money(1, "GBP"), Coin(2, "EUR")],
+             dehydrators={Money: lambda m: m.currency, Coin: lambda c: c.amount})
+    assert b == pack(["GBP", 2])
+
+
+@mark.parametrize("value,cls", [
+    (1, int),
+    (1.5, float),
+    ("x", str),
+    ([1], list),
+    ({"a": 1}, dict),
+], ids=["int", "float", "str", "list", "dict"])
+def test_dehydrator_for_native_type(value, cls):
+    b = pack(value, dehydrators={cls: lambda v: Structure(b"X")})
+    assert b == b"\xB0X"
+
+
+@mark.parametrize("value", [[1] * 0x20, array("q", [1] * 0x20)], ids=["list", "array"])
+def test_dehydrator_for_native_type_in_bulk(value):
+    b = pack(value, dehydrators={int: lambda v: Structure(b"X")})
+    assert b == pack([Structure(b"X")] * 0x20)
+
+
+def test_register_dehydrator_for_native_type():
+    buffer = BytesIO()
+    packer = Packer(buffer)
+    packer.pack(1)
+    packer.register_dehydrator(int, str)
+    packer.pack(2)
+    assert buffer.getvalue() == b"\x01\x812"
+
+
+def test_resolved_encoder_is_cached():
+    packer = Packer(BytesIO())
+    packer.pack(Tags())
+    assert Tags in packer._encoders
+
+
+DISPATCH_VALUES = [
+    ("str", "x"),
+    ("int", 1),
+    ("float", 1.5),
+    ("bool", True),
+    ("none", None),
+    ("dict", {}),
+    ("ordered-dict", OrderedDict()),
+    ("native-datetime", datetime(2000, 1, 1)),
+    ("datetime", DateTime(2000, 1, 1)),
+    ("native-date", date(2000, 1, 1)),
+    ("date", Date(2000, 1, 1)),
+    ("time", Time(12, 0, 0)),
+    ("timedelta", timedelta()),
+    ("duration", Duration()),
+    ("point", CartesianPoint((0, 0))),
+    ("float-subclass", Celsius(1.5)),
+    ("list-subclass", Tags()),
+]
+
+
+@mark.parametrize("value", [value for _, value in DISPATCH_VALUES],
+                  ids=[name for name, _ in DISPATCH_VALUES])
+def test_pack_dispatch(benchmark, value):
+    benchmark.group = "pack-dispatch"
+    # Mix in empty lists, so that dispatch cannot be bypassed by the
+    # bulk encoding of homogeneous lists
+    values = [value, []] * 0x100
+    benchmark(pack, values, version=(2, 0))
+
+
+def test_pack_into_internal_buffer():
+    packer = Packer(capacity=0x100)
+    packer.pack([1, "two", {"three": 3.0}])
+    with packer.view() as view:
+        assert view.tobytes() == pack([1, "two", {"three": 3.0}])
+
+
+def test_pack_into_bytearray():
+    buffer = bytearray(b"\x00")
+    packer = Packer(buffer)
+    packer.pack("hello")
+    packer.pack([])
+    assert buffer == b"\x00\x85hello\x90"
+    with packer.view() as view:
+        assert view.tobytes() == buffer
+
+
+def test_cannot_view_file_like_buffer():
+    with raises(TypeError):
+        Packer(BytesIO()).view()
+
+
+def test_cannot_pack_while_viewed():
+    packer = Packer()
+    packer.pack(1)
+    with packer.view():
+        with raises(BufferError):
+            packer.pack(2)
+    packer.pack(2)
+    with packer.view() as view:
+        assert view.tobytes() == b"\x01\x02"
+
+
+@mark.parametrize("target", ["bytes-io", "bytearray", "internal"])
+def test_pack_records_into_buffer(benchmark, target):
+    benchmark.group = "pack-buffer"
+    records = [{"id": i, "name": "Node %d" % i, "tags": ["a", "b"], "score": 0.5}
+               for i in range(1000)]
+
+    def pack_records():
+        if target == "bytes-io":
+            buffer = BytesIO()
+            Packer(buffer).pack(records)
+            return buffer.getvalue()
+        elif target == "bytearray":
+            buffer = bytearray()
+            Packer(buffer).pack(records)
+            return buffer
+        else:
+            packer = Packer(capacity=0x10000)
+            packer.pack(records)
+            return packer.view()
+
+    assert bytes(benchmark(pack_records)) == pack(records)
+
+
+def test_reset_internal_buffer():
+    packer = Packer()
+    packer.pack("a" * 100)
+    capacity = packer.capacity
+    assert packer.size == 102
+    packer.reset()
+    assert packer.size == 0
+    packer.pack(1)
+    assert packer.size == 1
+    assert packer.capacity == capacity
+    with packer.view() as view:
+        assert view.tobytes() == b"\x01"
+
+
+def test_reserved_capacity():
+    packer = Packer(capacity=0x1000)
+    assert packer.size == 0
+    assert packer.capacity == 0x1000
+    packer.pack("a" * 0x800)
+    assert packer.capacity == 0x1000
+
+
+def test_reset_bytearray_buffer():
+    buffer = bytearray()
+    packer = Packer(buffer)
+    packer.pack([1, 2, 3])
+    assert packer.size == 4
+    assert packer.capacity >= 4
+    packer.reset()
+    assert buffer == b""
+    assert packer.size == 0
+
+
+def test_cannot_reset_file_like_buffer():
+    packer = Packer(BytesIO())
+    with raises(TypeError):
+        packer.reset()
+    with raises(TypeError):
+        _ = packer.size
+
+
+@mark.parametrize("reuse", [False, True], ids=["fresh", "reused"])
+def test_pack_many_messages(benchmark, reuse):
+    benchmark.group = "pack-messages"
+    messages = [["RUN", "RETURN $x", {"x": i}, {}] for i in range(1000)]
+    packer = Packer(capacity=0x100)
+
+    def pack_messages():
+        if reuse:
+            for message in messages:
+                packer.reset()
+                packer.pack(message)
+                with packer.view() as view:
+                    view.tobytes()
+        else:
+            for message in messages:
+                pack(message)
+
+    benchmark(pack_messages)
+
+
+@mark.parametrize("value", ["", "hello", "x" * 0x10, "x" * 0x100, "x" * 0x10000, "\u00e9t\u00e9"])
+def test_encoded_string_cache(value):
+    cache = EncodedStringCache()
+    assert cache.encode(value) == pack(value)
+    assert cache.encode(value) is cache.encode(value)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_encoded_string_cache_eviction():
+    cache = EncodedStringCache(max_entries=2, max_bytes=10)
+    for value in ["one", "two", "one", "three", "x" * 20]:
+        cache.encode(value)
+    assert "one" in cache
+    assert "two" not in cache
+    assert "x" * 20 not in cache
+    assert cache.nbytes == 10
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 1)
+
+
+def test_pack_with_string_cache():
+    cache = EncodedStringCache()
+    value = [{"name": "Alice", "tags": ["a", "b"]}, {"name": "Bob", "tags": ["a"]}]
+    assert pack(value, string_cache=cache) == pack(value)
+    assert (cache.hits, cache.misses) == (3, 6)
+    assert "name" in cache
+
+
+RECORD_BATCH = [{"id": i, "name": "Node %d" % i, "labels": ["Person", "Employee"],
+                 "status": "ACTIVE", "department": "Engineering", "score": 0.5}
+                for i in range(1000)]
+
+
+@mark.parametrize("string_cache", [None, EncodedStringCache()], ids=["encode", "cache"])
+def test_pack_record_batch(benchmark, string_cache):
+    benchmark.group = "pack-record-batch"
+    data = benchmark(pack, RECORD_BATCH, string_cache=string_cache)
+    assert data == pack(RECORD_BATCH)
+
+
+def pack_records(records, keys=None):
+    buffer = BytesIO()
+    encoder = RecordEncoder(Packer(buffer), keys)
+    encoder.pack_many(records)
+    return buffer.getvalue()
+
+
+@mark.parametrize("size", [0, 1, 0x0F, 0x10, 0x100])
+def test_record_encoder(size):
+    records = [{"k%d" % j: i * j for j in range(size)} for i in range(3)]
+    assert pack_records(records) == pack(records)
+
+
+def test_record_encoder_learns_keys():
+    buffer = BytesIO()
+    encoder = RecordEncoder(Packer(buffer))
+    assert encoder.keys is None
+    encoder.pack({"id": 1, "name": "Alice"})
+    assert encoder.keys == ("id", "name")
+
+
+def test_record_encoder_with_given_keys():
+    records = [{b"id": 1, "name": "Alice"}, {b"id": 2, "name": "Bob"}]
+    assert pack_records(records, keys=[b"id", "name"]) == pack(records)
+
+
+def test_record_encoder_falls_back_for_other_shapes():
+    records = [{"id": 1, "name": "Alice"}, {"name": "Bob", "id": 2}, {"id": 3},
+               OrderedDict([("id", 4), ("name", "Carol")]), None, [1, 2]]
+    assert pack_records(records) == pack(records)
+
+
+def test_record_encoder_with_dict_dehydrator():
+    buffer = BytesIO()
+    encoder = RecordEncoder(Packer(buffer, dehydrators={dict: lambda d: Structure(b"R")}))
+    encoder.pack_many([{"id": 1}, {"id": 2}])
+    assert buffer.getvalue() == pack([Structure(b"R")] * 2)
+
+
+class Key(str):
+    pass
+
+
+@mark.parametrize("keys", [[1], [Key("id")]], ids=["int", "str-subclass"])
+def test_record_encoder_invalid_keys(keys):
+    with raises(TypeError):
+        _ = RecordEncoder(Packer(BytesIO()), keys=keys)
+
+
+def test_record_encoder_rejects_str_subclass_keys_as_packer_does():
+    encoder = RecordEncoder(Packer(BytesIO()), keys=["id"])
+    with raises(TypeError):
+        _ = pack({Key("id"): 1})
+    with raises(TypeError):
+        encoder.pack({Key("id"): 1})
+
+
+@mark.parametrize("template", [False, True], ids=["pack", "record-encoder"])
+def test_pack_records_with_template(benchmark, template):
+    benchmark.group = "pack-record-template"
+    if template:
+        data = benchmark(pack_records, RECORD_BATCH)
+    else:
+        data = benchmark(pack, RECORD_BATCH)
+    assert data == pack(RECORD_BATCH)
+
+
+@mark.parametrize("size", [0, 1, 0x0F, 0x10, 0xFF, 0x100, 0x10000])
+@mark.parametrize("char", ["x", "\u00e9"])
+def test_pack_str_sizes(size, char):
+    value = char * size
+    data = value.encode("utf-8")
+    assert pack(value) == pack(data)
+
+
+class DelegatingPacker(Packer):
+    """ Packer that writes every string header through `_pack_utf8`,
+    as a baseline against which the inline headers can be compared.
+    """
+
+    def _reset_encoders(self):
+        super(DelegatingPacker, self)._reset_encoders()
+        self._encoders[str] = DelegatingPacker._pack_unicode
+
+    def _pack_unicode(self, value):
+        if len(value) == 0:
+            self._write(b"\x80")
+        else:
+            self._pack_utf8(value.encode("utf-8"))
+
+
+@mark.parametrize("packer_class", [Packer, DelegatingPacker])
+@mark.parametrize("name,values", [("ascii", ASCII_TEXT), ("multibyte", MULTIBYTE_TEXT)],
+                  ids=["ascii", "multibyte"])
+def test_pack_text(benchmark, packer_class, name, values):
+    benchmark.group = "pack-text-%s" % name
+
+    def pack_text():
+        buffer = BytesIO()
+        packer_class(buffer).pack(values)
+        return buffer.getvalue()
+
+    assert benchmark(pack_text) == pack(values)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from concurrent.futures import ProcessPoolExecutor
+from os import name as os_name
+from subprocess import PIPE, run
+from sys import executable, modules
+
+from pytest import fixture, mark, raises
+
+from interchange.packstream import pack, unpack, unpack_parallel, Structure, Unpacker
+from interchange.packstream import _batch_boundaries, _skip_values, _value_boundaries
+
+from ..common import ROOT
+from .common import STR_L, LIST_M, DICT_M
+
+
+VALUES = [None, True, 1, -0x8000, 2 ** 40, 3.14, "hello", STR_L, bytearray(b"\x00\x01"),
+          LIST_M, DICT_M, Structure(0x4E, 1, ["X"], {}), [1, ["two", {"three": 3.0}]]]
+
+RECORDS = [[i, "Node %d" % i, {"score": i / 7, "tags": ["a", "b"]}] for i in range(10000)]
+
+
+@fixture(scope="module")
+def executor():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+@mark.parametrize("value", VALUES)
+def test_skip_value(value):
+    data = pack(value, 0)
+    assert _skip_values(data, 0, 1) == len(data) - 1
+
+
+def test_skip_truncated_value():
+    with raises(IndexError):
+        _ = _skip_values(pack(STR_L)[:-1], 0, 1)
+
+
+@mark.parametrize("items", [list(range(0x20)), [0x7FFF] * 0x20], ids=["tiny-int", "int-16"])
+def test_skip_truncated_uniform_list(items):
+    data = pack(items)[:-3]
+    with raises(IndexError):
+        _ = _skip_values(data, 0, 1)
+    with raises(IndexError):
+        _ = Unpacker(data, lazy=True).unpack()
+
+
+def test_skip_unknown_marker():
+    with raises(ValueError):
+        _ = _skip_values(b"\xDF", 0, 1)
+
+
+def test_boundaries_of_top_level_values():
+    data = pack(1, "two", [3])
+    assert _value_boundaries(data) == ([0, 1, 5, 7], False)
+
+
+def test_boundaries_of_list_items():
+    data = pack([1, "two", [3]])
+    assert _value_boundaries(data) == ([1, 2, 6, 8], True)
+
+
+def test_batches_are_contiguous():
+    boundaries = list(range(0, 1000, 10))
+    batches = _batch_boundaries(boundaries, 7)
+    assert len(batches) <= 7
+    assert batches[0][0] == 0
+    assert batches[-1][1] == 990
+    assert all(a[1] == b[0] for a, b in zip(batches, batches[1:]))
+
+
+def test_unpack_top_level_values_in_parallel(executor):
+    data = pack(*(VALUES * 10))
+    assert unpack_parallel(data, workers=2, executor=executor) == VALUES * 10
+
+
+def test_unpack_list_items_in_parallel(executor):
+    data = pack(RECORDS)
+    assert unpack_parallel(data, workers=2, executor=executor) == [RECORDS]
+
+
+def test_unpack_in_parallel_with_own_processes():
+    data = pack(*VALUES)
+    assert unpack_parallel(data, workers=2) == VALUES
+
+
+def test_unpack_typed_list_items_in_parallel(executor):
+    data = pack(list(range(100000)))
+    values = unpack_parallel(data, workers=2, typed_lists=True, executor=executor)
+    assert values == list(unpack(data, typed_lists=True))
+    assert values[0].typecode == "q"
+
+
+def test_unpack_without_shared_memory_support(monkeypatch):
+    # As on Python 3.7
+    monkeypatch.setitem(modules, "multiprocessing.shared_memory", None)
+    data = pack(*VALUES)
+    assert unpack_parallel(data, workers=2) == VALUES
+
+
+# Starts a pool of forked workers before this process has any shared
+# memory, and so before it has a resource tracker for them to inherit
+POOL_BEFORE_SHARED_MEMORY_SCRIPT = """\
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from interchange.packstream import pack, unpack_parallel
+data = pack(*([[1, "two", 3.0]] * 1000))
+with ProcessPoolExecutor(2, mp_context=get_context("fork")) as executor:
+    assert list(executor.map(abs, range(4))) == [0, 1, 2, 3]
+    for _ in range(3):
+        assert unpack_parallel(data, workers=2, executor=executor) == [[1, "two", 3.0]] * 1000
+print("ok")
+"""
+
+
+@mark.skipif(os_name != "posix", reason="Requires the fork start method")
+def test_unpack_with_pool_started_before_shared_memory():
+    result = run([executable, "-c", POOL_BEFORE_SHARED_MEMORY_SCRIPT],
+                 cwd=ROOT, stdout=PIPE, stderr=PIPE, timeout=60)
+    assert result.stdout == b"ok\n"
+    # Including warnings from resource trackers about leaked or
+    # unknown shared memory blocks
+    assert result.stderr == b""
+
+
+def test_unpack_with_single_worker():
+    data = pack(*VALUES)
+    assert unpack_parallel(data, workers=1) == VALUES
+
+
+def test_unpack_nothing():
+    assert unpack_parallel(b"", workers=2) == []
+
+
+def test_unpack_truncated_data():
+    with raises(IndexError):
+        _ = unpack_parallel(pack(*VALUES)[:-1], workers=2)
+
+
+@mark.parametrize("workers", [1, 2, 4])
+def test_unpack_records_in_parallel(benchmark, workers):
+    benchmark.group = "unpack-parallel"
+    data = pack(RECORDS * 10)
+    with ProcessPoolExecutor(workers) as executor:
+        values = benchmark(unpack_parallel, data, workers=workers, executor=executor)
+    assert values == list(unpack(data))
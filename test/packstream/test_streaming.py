@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from io import BytesIO
+from socket import socketpair
+
+from pytest import raises
+
+from interchange.packstream import pack, StreamUnpacker
+
+from .common import STR_L, LIST_M, DICT_M, TrickleReader
+
+
+VALUES = [None, True, 1, -0x8000, 3.14, "hello", STR_L, LIST_M, DICT_M,
+          [1, ["two", {"three": 3.0}]]]
+
+DATA = pack(*VALUES)
+
+
+class ShortReader(object):
+    """ File-like object that returns at most `limit` bytes per read,
+    however many are requested, as a socket often does.
+    """
+
+    def __init__(self, data, limit):
+        self._source = BytesIO(data)
+        self._limit = limit
+
+    def readinto(self, b):
+        with memoryview(b) as view:
+            return self._source.readinto(view[:self._limit])
+
+
+def test_stream_from_readinto_source():
+    assert list(StreamUnpacker(BytesIO(DATA))) == VALUES
+
+
+def test_stream_from_read_source():
+    assert list(StreamUnpacker(TrickleReader(DATA))) == VALUES
+
+
+def test_stream_with_small_reads():
+    assert list(StreamUnpacker(BytesIO(DATA), read_size=3)) == VALUES
+
+
+def test_stream_from_socket():
+    a, b = socketpair()
+    try:
+        a.sendall(DATA)
+        a.close()
+        assert list(StreamUnpacker(b, read_size=7)) == VALUES
+    finally:
+        b.close()
+
+
+def test_stream_yields_values_as_they_arrive():
+    a, b = socketpair()
+    try:
+        stream = iter(StreamUnpacker(b))
+        a.sendall(pack("first"))
+        assert next(stream) == "first"
+        a.sendall(pack([1, 2, 3])[:2])
+        a.sendall(pack([1, 2, 3])[2:])
+        assert next(stream) == [1, 2, 3]
+        a.close()
+        assert list(stream) == []
+    finally:
+        b.close()
+
+
+def count_decoding_steps(source):
+    unpacker = StreamUnpacker(source)
+    unpack = unpacker._unpacker.unpack
+    steps = []
+
+    def counting_unpack():
+        steps.append(None)
+        return unpack()
+
+    unpacker._unpacker.unpack = counting_unpack
+    assert list(unpacker) == [[DICT_M] * 50, "end"]
+    return len(steps)
+
+
+def test_stream_decodes_each_value_once_from_short_reads():
+    data = pack([DICT_M] * 50, "end")
+    assert count_decoding_steps(ShortReader(data, 0x100)) == count_decoding_steps(BytesIO(data))
+
+
+def test_stream_buffer_does_not_retain_consumed_values():
+    unpacker = StreamUnpacker(BytesIO(pack(*([STR_L] * 20))), read_size=0x100)
+    for value in unpacker:
+        assert value == STR_L
+        assert len(unpacker._buffer) < 3 * len(STR_L)
+
+
+def test_stream_value_larger_than_max_buffer_size():
+    unpacker = StreamUnpacker(BytesIO(pack("A" * 100)), max_buffer_size=64)
+    with raises(ValueError):
+        _ = unpacker.unpack()
+
+
+def test_stream_within_max_buffer_size():
+    data = pack(*(["A" * 100] * 10))
+    unpacker = StreamUnpacker(BytesIO(data), read_size=16, max_buffer_size=128)
+    assert list(unpacker) == ["A" * 100] * 10
+
+
+def test_stream_truncated_value():
+    unpacker = StreamUnpacker(BytesIO(pack("hello")[:-1]))
+    with raises(ValueError):
+        _ = unpacker.unpack()
+
+
+def test_stream_end():
+    unpacker = StreamUnpacker(BytesIO(b""))
+    with raises(EOFError):
+        _ = unpacker.unpack()
+
+
+def test_stream_throughput(benchmark):
+    data = pack(*([DICT_M] * 20))
+
+    def unpack_all():
+        return sum(1 for _ in StreamUnpacker(BytesIO(data)))
+
+    assert benchmark(unpack_all) == 20
@@ -22,7 +22,7 @@ from pytest import mark, raises
 from pytz import utc, FixedOffset
 
 from interchange.geo import CartesianPoint, WGS84Point, Point
-from interchange.packstream import pack
+from interchange.packstream import pack, unpack, Structure
 from interchange.time import Date, Time, DateTime, Duration
 
 from .common import pack_and_unpack
@@ -95,3 +95,92 @@ def test_3d_point(cls, srid):
 def test_4d_point():
     with raises(ValueError):
         _ = pack(Point((0, 0, 0, 0)), version=(2, 0))
+
+
+def test_pack_many_datetimes(benchmark):
+    values = [DateTime(2000 + i % 100, 1 + i % 12, 1 + i % 28, i % 24, i % 60, i % 60)
+              for i in range(100000)]
+    data = benchmark.pedantic(pack, args=(values,), kwargs={"version": (2, 0)}, rounds=3)
+    assert data[:5] == b"\xD6\x00\x01\x86\xA0"
+
+
+@mark.parametrize("year", [1, 1970, 2000, 9999])
+def test_datetime_clock_time_far_from_epoch(year):
+    value = DateTime(year, 6, 15, 12, 30, 45.5)
+    b, unpacked = pack_and_unpack(value, version=(2, 0))
+    assert unpacked == value
+
+
+class Node(object):
+
+    def __init__(self, identity, labels, properties):
+        self.identity = identity
+        self.labels = labels
+        self.properties = properties
+
+    def __eq__(self, other):
+        return (self.identity, self.labels, self.properties) == \
+               (other.identity, other.labels, other.properties)
+
+
+def dehydrate_node(node):
+    return Structure(b"N", node.identity, node.labels, node.properties)
+
+
+def test_structure():
+    b, unpacked = pack_and_unpack(Structure(0x4E, 1, ["Person"], {}))
+    assert b == b"\xB3N\x01\x91\x86Person\xA0"
+    assert unpacked == Structure(0x4E, 1, ["Person"], {})
+
+
+def test_structure_too_large():
+    with raises(ValueError):
+        _ = pack(Structure(0x4E, *range(16)))
+
+
+@mark.parametrize("tag", [-1, 0x100])
+def test_structure_tag_out_of_range(tag):
+    with raises(ValueError):
+        _ = pack(Structure(tag, 1))
+
+
+@mark.parametrize("tag", [0x4E, "N", b"N"])
+def test_custom_hydrator(tag):
+    data = b"\xB3N\x01\x91\x86Person\xA0"
+    unpacked = next(unpack(data, hydrators={tag: Node}))
+    assert unpacked == Node(1, ["Person"], {})
+
+
+def test_custom_hydrator_leaves_defaults_in_place():
+    data = pack([Structure(0x4E, 1, [], {}), Date(1970, 1, 1)], version=(2, 0))
+    unpacked = next(unpack(data, hydrators={"N": Node}))
+    assert unpacked == [Node(1, [], {}), Date(1970, 1, 1)]
+
+
+def test_custom_hydrator_overrides_default():
+    data = pack(Date(1970, 1, 2), version=(2, 0))
+    assert next(unpack(data, hydrators={"D": lambda days: days})) == 1
+
+
+def test_structure_without_hydrator():
+    data = b"\xB1N\x01"
+    assert next(unpack(data)) == Structure(0x4E, 1)
+
+
+def test_custom_dehydrator():
+    b = pack(Node(1, ["Person"], {}), dehydrators={Node: dehydrate_node})
+    assert b == b"\xB3N\x01\x91\x86Person\xA0"
+
+
+def test_custom_dehydrator_in_collections():
+    node = Node(1, [], {})
+    b = pack({"nodes": [node, node]}, dehydrators={Node: dehydrate_node})
+    unpacked = next(unpack(b, hydrators={"N": Node}))
+    assert unpacked == {"nodes": [node, node]}
+
+
+def test_unpack_custom_structures(benchmark):
+    data = pack([Node(i, ["Person"], {"name": "Alice"}) for i in range(0x1000)],
+                dehydrators={Node: dehydrate_node})
+    unpacked = benchmark(lambda: next(unpack(data, hydrators={"N": Node})))
+    assert unpacked[0] == Node(0, ["Person"], {"name": "Alice"})
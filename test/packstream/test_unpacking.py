@@ -16,13 +16,20 @@
 # limitations under the License.
 
 
+from codecs import decode
+from functools import partial
 from math import isnan
+from mmap import mmap
+from random import Random
+from struct import unpack as struct_unpack
+from tempfile import TemporaryFile
 
-from pytest import raises
+from pytest import mark, raises
 
-from interchange.packstream import unpack
+from interchange.packstream import pack, unpack, Unpacker, Structure, LazyList, LazyMap, StringCache
 
 from .common import (
+    ASCII_TEXT, MULTIBYTE_TEXT,
     STR_S, STR_S_DATA,
     STR_M, STR_M_DATA,
     STR_L, STR_L_DATA,
@@ -173,3 +180,461 @@ def test_unpack_unknown_marker():
 
 def test_unpack_multiple():
     assert list(unpack(b"\x01\x02\x03")) == [1, 2, 3]
+
+
+def test_unpack_zero_copy_bytes():
+    data = b"\xCD\x01\x00" + bytes(bytearray(range(0x100)))
+    value = next(unpack(data, zero_copy=True))
+    assert isinstance(value, memoryview)
+    assert value.obj is data
+    assert value == bytearray(range(0x100))
+
+
+def test_unpack_zero_copy_mixed():
+    values = ["hello", bytearray(b"world"), [1, 2.0, {"three": None}]]
+    data = pack(*values)
+    unpacked = list(unpack(bytearray(data), zero_copy=True))
+    assert unpacked[0] == values[0]
+    assert isinstance(unpacked[1], memoryview)
+    assert unpacked[1] == values[1]
+    assert unpacked[2] == values[2]
+
+
+def test_unpack_zero_copy_from_mmap():
+    data = pack("hello", BYTEARRAY_L, 42)
+    with TemporaryFile() as f:
+        f.write(data)
+        f.flush()
+        m = mmap(f.fileno(), 0)
+        try:
+            unpacked = list(unpack(m, zero_copy=True))
+            assert unpacked[0] == "hello"
+            assert unpacked[1] == BYTEARRAY_L
+            assert unpacked[2] == 42
+            del unpacked
+        finally:
+            m.close()
+
+
+def test_unpack_bytes_l_zero_copy(benchmark):
+    assert next(benchmark(unpack, BYTEARRAY_L_DATA, zero_copy=True)) == BYTEARRAY_L
+
+
+class SlicingUnpacker(Unpacker):
+    """ Unpacker that reads numbers by slicing the buffer and parsing
+    the format string on every call, as a baseline against which the
+    precompiled struct readers can be compared.
+    """
+
+    def _slice(self, n):
+        q = self._offset + n
+        m = self._data[self._offset:q]
+        self._offset = q
+        return m
+
+    def _read_u16be(self):
+        return struct_unpack(">H", self._slice(2))[0]
+
+    def _read_u32be(self):
+        return struct_unpack(">I", self._slice(4))[0]
+
+    def _read_i8(self):
+        return struct_unpack(">b", self._slice(1))[0]
+
+    def _read_i16be(self):
+        return struct_unpack(">h", self._slice(2))[0]
+
+    def _read_i32be(self):
+        return struct_unpack(">i", self._slice(4))[0]
+
+    def _read_i64be(self):
+        return struct_unpack(">q", self._slice(8))[0]
+
+    def _read_f64be(self):
+        return struct_unpack(">d", self._slice(8))[0]
+
+
+_random = Random(0)
+
+INT_HEAVY = [_random.choice([-0x80, -0x8000, 0x8000, 0x80000000]) + _random.randint(-0x10, 0x10)
+             for _ in range(0x1000)]
+INT_HEAVY_DATA = pack(INT_HEAVY)
+
+FLOAT_HEAVY = [_random.uniform(-1e10, 1e10) for _ in range(0x1000)]
+FLOAT_HEAVY_DATA = pack(FLOAT_HEAVY)
+
+
+@mark.parametrize("unpacker_class", [Unpacker, SlicingUnpacker])
+def test_unpack_int_heavy(benchmark, unpacker_class):
+    benchmark.group = "unpack-int-heavy"
+    assert benchmark(lambda: unpacker_class(INT_HEAVY_DATA).unpack()) == INT_HEAVY
+
+
+@mark.parametrize("unpacker_class", [Unpacker, SlicingUnpacker])
+def test_unpack_float_heavy(benchmark, unpacker_class):
+    benchmark.group = "unpack-float-heavy"
+    assert benchmark(lambda: unpacker_class(FLOAT_HEAVY_DATA).unpack()) == FLOAT_HEAVY
+
+
+MARKER_FAMILIES = [
+    ("null", None),
+    ("boolean", True),
+    ("tiny-int", 1),
+    ("tiny-negative-int", -1),
+    ("int-8", -0x80),
+    ("int-16", 0x8000 - 1),
+    ("int-32", 0x80000000 - 1),
+    ("int-64", 0x80000000),
+    ("float", 3.14),
+    ("tiny-string", "hello"),
+    ("string-8", STR_S),
+    ("string-16", STR_M),
+    ("bytes-8", BYTEARRAY_S),
+    ("bytes-16", BYTEARRAY_M),
+    ("tiny-list", [1, 2, 3]),
+    ("list-8", LIST_S),
+    ("tiny-dict", {"one": 1}),
+    ("dict-8", DICT_S),
+]
+
+
+@mark.parametrize("value", [value for _, value in MARKER_FAMILIES],
+                  ids=[family for family, _ in MARKER_FAMILIES])
+def test_unpack_marker_family(benchmark, value):
+    benchmark.group = "unpack-marker-family"
+    values = [value] * 0x100
+    data = pack(values)
+    assert benchmark(lambda: Unpacker(data).unpack()) == values
+
+
+def test_unpack_marker_family_structure(benchmark):
+    benchmark.group = "unpack-marker-family"
+    data = b"\xD5\x01\x00" + b"\xB2N\x01\x02" * 0x100
+    assert benchmark(lambda: Unpacker(data).unpack()) == [Structure(0x4E, 1, 2)] * 0x100
+
+
+@mark.parametrize("value", [value for _, value in MARKER_FAMILIES] + [STR_L, BYTEARRAY_L, LIST_L, DICT_M],
+                  ids=[family for family, _ in MARKER_FAMILIES] + ["string-32", "bytes-32", "list-16", "dict-16"])
+def test_skip(value):
+    unpacker = Unpacker(pack(value, "next"))
+    unpacker.skip()
+    assert unpacker.unpack() == "next"
+
+
+def test_skip_many():
+    unpacker = Unpacker(pack(1, [2, {"three": 3}], Structure(0x4E, 4), "next"))
+    unpacker.skip(3)
+    assert unpacker.unpack() == "next"
+
+
+@mark.parametrize("value", [
+    list(range(0x20)),
+    [None, True, False, -1] * 0x10,
+    [1.5] * 0x20,
+    ["one", "two"] * 0x10,
+    ["one", "three"] * 0x10,
+    [1] * 0x1F + [[1, 2, 3]],
+    [1.5] * 0x1F + [1],
+], ids=["tiny-ints", "single-byte", "floats", "strings", "mixed-strings",
+        "nested-list", "mixed-numbers"])
+def test_skip_list_items(value):
+    unpacker = Unpacker(pack(value, "next"))
+    unpacker.skip()
+    assert unpacker.unpack() == "next"
+
+
+@mark.parametrize("value", [[1, 2, 3], list(range(0x20)), [1.5] * 0x20])
+def test_skip_truncated_value(value):
+    unpacker = Unpacker(pack(value)[:-1])
+    with raises(IndexError):
+        unpacker.skip()
+
+
+@mark.parametrize("value,kind", [
+    (None, "null"),
+    (True, "boolean"),
+    (-1, "integer"),
+    (0x80000000, "integer"),
+    (3.14, "float"),
+    (bytearray(b"\x00"), "bytes"),
+    ("hello", "string"),
+    (STR_S, "string"),
+    ([], "list"),
+    (LIST_S, "list"),
+    ({}, "dictionary"),
+    (DICT_S, "dictionary"),
+    (Structure(0x4E), "structure"),
+])
+def test_peek_type(value, kind):
+    unpacker = Unpacker(pack(value))
+    assert unpacker.peek_type() == kind
+    assert unpacker.unpack() == value
+
+
+def test_peek_type_of_unknown_marker():
+    with raises(ValueError):
+        _ = Unpacker(b"\xDF").peek_type()
+
+
+WIDE_RECORD = [STR_L, LIST_L, DICT_M, FLOAT_HEAVY, "last"]
+WIDE_RECORD_DATA = pack(WIDE_RECORD)
+
+
+@mark.parametrize("skip", [False, True], ids=["unpack", "skip"])
+def test_unpack_last_field(benchmark, skip):
+    benchmark.group = "unpack-last-field"
+
+    def last_field():
+        unpacker = Unpacker(WIDE_RECORD_DATA)
+        unpacker._offset = 1
+        if skip:
+            unpacker.skip(4)
+        else:
+            for _ in range(4):
+                unpacker.unpack()
+        return unpacker.unpack()
+
+    assert benchmark(last_field) == "last"
+
+
+LAZY_VALUES = [
+    [],
+    [1, "two", 3.0],
+    LIST_S,
+    LIST_L,
+    [1.5] * 0x20,
+    {},
+    {"one": 1, "two": [2, {"three": 3}]},
+    DICT_M,
+    Structure(0x4E, [1, 2], {"a": 1}),
+]
+
+
+@mark.parametrize("value", LAZY_VALUES)
+def test_unpack_lazy(value):
+    unpacker = Unpacker(pack(value, "next"), lazy=True)
+    assert unpacker.unpack() == value
+    assert unpacker.unpack() == "next"
+
+
+def test_lazy_list():
+    value = Unpacker(pack([1, [2, 3], {"four": 4}]), lazy=True).unpack()
+    assert isinstance(value, LazyList)
+    assert len(value) == 3
+    assert value[0] == 1
+    assert value[-1] == {"four": 4}
+    assert isinstance(value[1], LazyList)
+    assert value[1:] == [[2, 3], {"four": 4}]
+    assert value[1] is value[1]
+    with raises(IndexError):
+        _ = value[3]
+
+
+def test_lazy_map():
+    value = Unpacker(pack({"id": 1, "tags": ["a"], "props": {}}), lazy=True).unpack()
+    assert isinstance(value, LazyMap)
+    assert len(value) == 3
+    assert value["id"] == 1
+    assert list(value) == ["id", "tags", "props"]
+    assert value["tags"] is value["tags"]
+    assert value.get("missing") is None
+    with raises(KeyError):
+        _ = value["missing"]
+
+
+def test_lazy_map_with_repeated_key():
+    data = b"\xA3\x81a\x01\x81b\x02\x81a\x03"
+    value = Unpacker(data, lazy=True).unpack()
+    assert value["a"] == 3
+    assert len(value) == 2
+    assert list(value.items()) == list(Unpacker(data).unpack().items())
+
+
+def test_lazy_access_does_not_move_unpacker():
+    unpacker = Unpacker(pack([1, 2], [3, 4]), lazy=True)
+    first = unpacker.unpack()
+    assert first[1] == 2
+    assert unpacker.unpack() == [3, 4]
+
+
+def test_lazy_typed_lists():
+    with raises(ValueError):
+        _ = Unpacker(pack([1]), typed_lists=True, lazy=True)
+
+
+WIDE_RECORDS = [dict({"id": i}, **{"field_%d" % j: [j, "value %d" % j, {"x": j / 2}]
+                                   for j in range(100)}) for i in range(100)]
+WIDE_RECORDS_DATA = pack(WIDE_RECORDS)
+
+
+@mark.parametrize("lazy", [False, True], ids=["eager", "lazy"])
+def test_unpack_ids_of_wide_records(benchmark, lazy):
+    benchmark.group = "unpack-wide-record-ids"
+
+    def ids():
+        return [record["id"] for record in Unpacker(WIDE_RECORDS_DATA, lazy=lazy).unpack()]
+
+    assert benchmark(ids) == list(range(100))
+
+
+PERSON = {"name": "Alice", "address": {"city": "London", "postcode": "N1"},
+          "tags": ["a", "b"], "scores": list(range(100)), "friends": [{"name": "Bob"}]}
+
+
+@mark.parametrize("paths,expected", [
+    (["name"], {"name": "Alice"}),
+    (["address.city"], {"address.city": "London"}),
+    (["tags[0]"], {"tags[0]": "a"}),
+    (["friends[0].name"], {"friends[0].name": "Bob"}),
+    (["name", "scores[99]"], {"name": "Alice", "scores[99]": 99}),
+    (["address", "address.city"], {"address": PERSON["address"], "address.city": "London"}),
+    (["missing", "tags[2]", "name.first", "tags.first", "address[0]"], {}),
+])
+def test_select(paths, expected):
+    unpacker = Unpacker(pack(PERSON, "next"))
+    assert unpacker.select(paths) == expected
+    assert unpacker.unpack() == "next"
+
+
+def test_select_from_list():
+    assert Unpacker(pack([[1, 2], [3, 4]])).select(["[1][0]"]) == {"[1][0]": 3}
+
+
+def test_select_from_scalar():
+    unpacker = Unpacker(pack(1, "next"))
+    assert unpacker.select(["name"]) == {}
+    assert unpacker.unpack() == "next"
+
+
+@mark.parametrize("path", ["", ".name", "name.", "tags[x]", "tags[0"])
+def test_select_invalid_path(path):
+    with raises(ValueError):
+        _ = Unpacker(pack(PERSON)).select([path])
+
+
+def test_unpack_with_select():
+    data = pack(PERSON, {"name": "Bob"}, 1)
+    assert list(unpack(data, select=["name", "tags[0]"])) == [
+        {"name": "Alice", "tags[0]": "a"}, {"name": "Bob"}, {}]
+
+
+@mark.parametrize("select", [None, ["field_0", "field_50[1]", "field_99[2].x"]],
+                  ids=["all", "select"])
+def test_unpack_selected_fields(benchmark, select):
+    benchmark.group = "unpack-selected-fields"
+    data = pack(*WIDE_RECORDS)
+    assert len(benchmark(lambda: list(unpack(data, select=select)))) == 100
+
+
+def test_string_cache_evicts_least_recently_used():
+    cache = StringCache(max_entries=2)
+    one = cache.decode(b"one")
+    cache.decode(b"two")
+    assert cache.decode(b"one") is one
+    cache.decode(b"three")
+    assert len(cache) == 2
+    assert b"one" in cache
+    assert b"two" not in cache
+
+
+def test_string_cache_size_must_be_positive():
+    with raises(ValueError):
+        _ = StringCache(max_entries=0)
+
+
+def test_unpack_with_key_cache():
+    key_cache = StringCache()
+    records = list(unpack(pack(*WIDE_RECORDS[:2]), key_cache=key_cache))
+    assert records == WIDE_RECORDS[:2]
+    assert all(a is b for a, b in zip(records[0], records[1]))
+    assert len(key_cache) == 102
+
+
+@mark.parametrize("key", [STR_S, "\u00e9t\u00e9", "x" * 0x100])
+def test_unpack_with_key_cache_and_unusual_keys(key):
+    value = {key: 1, "other": [{key: 2}]}
+    assert next(unpack(pack(value), key_cache=StringCache())) == value
+
+
+@mark.parametrize("key_cache", [None, StringCache()], ids=["decode", "cache"])
+def test_unpack_repeated_keys(benchmark, key_cache):
+    benchmark.group = "unpack-repeated-keys"
+    data = pack(WIDE_RECORDS)
+    assert benchmark(lambda: Unpacker(data, key_cache=key_cache).unpack()) == WIDE_RECORDS
+
+
+def test_string_cache_evicts_by_size():
+    cache = StringCache(max_bytes=8)
+    cache.decode(b"one")
+    cache.decode(b"two")
+    assert cache.nbytes == 6
+    cache.decode(b"three")
+    assert b"one" not in cache
+    assert cache.nbytes == 8
+
+
+def test_string_cache_skips_large_strings():
+    cache = StringCache(max_bytes=4)
+    assert cache.decode(b"hello") == "hello"
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_string_cache_counters():
+    cache = StringCache()
+    for data in [b"a", b"b", b"a", b"a"]:
+        cache.decode(data)
+    assert (cache.hits, cache.misses) == (2, 2)
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+LABELLED = [{"label": label, "status": status, "name": "Node %d" % i}
+            for i, (label, status) in enumerate([("Person", "ACTIVE"), ("Place", "CLOSED"),
+                                                 ("Person", "PENDING" * 10)] * 100)]
+
+
+def test_unpack_with_string_cache():
+    string_cache = StringCache()
+    values = list(unpack(pack(*LABELLED), string_cache=string_cache))
+    assert values == LABELLED
+    assert values[0]["label"] is values[2]["label"]
+    assert values[2]["status"] is values[5]["status"]
+    assert string_cache.hits > string_cache.misses
+
+
+@mark.parametrize("string_cache", [None, StringCache()], ids=["decode", "cache"])
+def test_unpack_repeated_strings(benchmark, string_cache):
+    benchmark.group = "unpack-repeated-strings"
+    data = pack(LABELLED)
+    key_cache = StringCache()
+    assert benchmark(lambda: Unpacker(data, key_cache=key_cache,
+                                      string_cache=string_cache).unpack()) == LABELLED
+
+
+@mark.parametrize("values", [ASCII_TEXT, MULTIBYTE_TEXT], ids=["ascii", "multibyte"])
+@mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_unpack_text_from_buffer(values, buffer_type):
+    data = buffer_type(pack(values))
+    assert Unpacker(data).unpack() == values
+    assert Unpacker(data, zero_copy=True).unpack() == values
+
+
+class CodecsUnpacker(Unpacker):
+    """ Unpacker that decodes strings through :func:`codecs.decode`, as
+    a baseline against which direct UTF-8 decoding can be compared.
+    """
+
+    def __init__(self, data, **kwargs):
+        super(CodecsUnpacker, self).__init__(data, **kwargs)
+        self._decode_utf8 = partial(decode, encoding="utf-8")
+
+
+@mark.parametrize("unpacker_class", [Unpacker, CodecsUnpacker])
+@mark.parametrize("name,values", [("ascii", ASCII_TEXT), ("multibyte", MULTIBYTE_TEXT)],
+                  ids=["ascii", "multibyte"])
+def test_unpack_text(benchmark, unpacker_class, name, values):
+    benchmark.group = "unpack-text-%s" % name
+    data = pack(values)
+    assert benchmark(lambda: unpacker_class(data).unpack()) == values
@@ -20,6 +20,7 @@ from datetime import date
 from time import struct_time
 from unittest import TestCase
 
+from pytest import mark, raises
 import pytz
 
 from interchange.time import Duration, Date, UnixEpoch, ZeroDate
@@ -529,3 +530,27 @@ class DateTestCase(TestCase):
         expected = Date(2018, 10, 1)
         actual = Date.from_iso_format("2018-10-01")
         self.assertEqual(expected, actual)
+
+
+def test_from_ordinal_full_range():
+    for ordinal in list(range(1, 3652060, 97)) + [1, 2, 719162, 719163, 3652058, 3652059]:
+        native = date.fromordinal(ordinal)
+        d = Date.from_ordinal(ordinal)
+        assert (d.year, d.month, d.day) == (native.year, native.month, native.day)
+        assert d.to_ordinal() == ordinal
+
+
+@mark.parametrize("ordinal", [1, 2, 719162, 3652058, 3652059, 3652060, -1])
+def test_from_ordinal_bounds(ordinal):
+    if 1 <= ordinal <= 3652059:
+        assert Date.from_ordinal(ordinal).to_ordinal() == ordinal
+    else:
+        with raises(ValueError):
+            _ = Date.from_ordinal(ordinal)
+
+
+@mark.parametrize("year", [1, 1000, 1969, 1970, 2000, 5000, 9999])
+def test_from_ordinal_cost_is_flat(benchmark, year):
+    benchmark.group = "date-from-ordinal"
+    ordinal = date(year, 12, 31).toordinal()
+    assert benchmark(Date.from_ordinal, ordinal) == Date(year, 12, 31)
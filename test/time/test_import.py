@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+
+# Copyright Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from subprocess import check_output
+from sys import executable
+
+from ..common import ROOT, measure_import
+
+
+def test_import_time_and_memory(benchmark):
+    benchmark.group = "import"
+    result = benchmark.pedantic(measure_import, args=("interchange.time", []), rounds=5)
+    benchmark.extra_info.update(result)
+    assert result["own_size"] < 0x100000
+
+
+def test_calendar_tables_are_not_built_on_import():
+    script = ("import interchange.time as time; "
+              "print(sorted({'LEAP_YEARS', 'DAYS_IN_MONTH'} & set(vars(time))))")
+    assert check_output([executable, "-c", script], cwd=ROOT) == b"[]\n"
+
+
+def test_calendar_tables_are_built_on_demand():
+    import interchange.time as time
+    assert len(time.LEAP_YEARS) == 2424
+    assert 2000 in time.LEAP_YEARS
+    assert 1900 not in time.LEAP_YEARS
+    assert len(time.DAYS_IN_MONTH) == 12 * 9999
+    assert time.DAYS_IN_MONTH[(2000, 2)] == 29
+    assert time.DAYS_IN_MONTH[(2100, 2)] == 28
+
+
+def test_calendar_functions_match_standard_library():
+    from calendar import isleap, monthrange
+    from interchange.time import Date
+    for year in range(1, 10000):
+        assert Date.is_leap_year(year) == isleap(year)
+        for month in range(1, 13):
+            assert Date.days_in_month(year, month) == monthrange(year, month)[1]